@@ -0,0 +1,210 @@
+import argparse
+import math
+import time
+import random
+from pathfinder import (attach_endpoints, build_waypoint_graph, find_optimal_path, find_optimal_paths_to,
+                        get_occupancy_grid, get_route_table, get_wall_array, heuristic, line_is_clear)
+from message import generate_directions
+from grid_planner import OccupancyGrid
+from map_store import map_store
+from route_cache import RouteCache
+from navigation_session import NavigationSession
+
+
+# Function to time a callable, returning the mean seconds per call
+def timeit(fn, repeat):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def report(name, seconds):
+    print(f"  {name:<40} {seconds * 1e3:9.3f} ms")
+
+
+# Scalar reference: one lines_intersect call per waypoint pair and wall
+def scalar_waypoint_graph(waypoints, walls):
+    graph = {node: {} for node in waypoints}
+    for i, node_a in enumerate(waypoints):
+        for node_b in waypoints[i+1:]:
+            if line_is_clear(node_a, node_b, walls):
+                distance = heuristic(node_a, node_b)
+                graph[node_a][node_b] = distance
+                graph[node_b][node_a] = distance
+    return graph
+
+
+def scalar_attach(graph, walls, start_point, end_point):
+    query_graph = {node: dict(neighbors) for node, neighbors in graph.items()}
+    query_graph.setdefault(start_point, {})
+    query_graph.setdefault(end_point, {})
+    for point in (start_point, end_point):
+        for node in graph:
+            if line_is_clear(point, node, walls):
+                query_graph[point][node] = query_graph[node][point] = heuristic(point, node)
+    if start_point != end_point and line_is_clear(start_point, end_point, walls):
+        query_graph[start_point][end_point] = query_graph[end_point][start_point] = heuristic(start_point, end_point)
+    return query_graph
+
+
+def bench_visibility(floor_map, repeat):
+    walls = floor_map.walls
+    wall_array = get_wall_array(floor_map)
+    waypoints = floor_map.waypoints
+    start_point = (130.0, 350.0)
+    end_point = floor_map.destinations[sorted(floor_map.destinations)[0]][:2]
+
+    graph = build_waypoint_graph(waypoints, wall_array)
+    assert graph == scalar_waypoint_graph(waypoints, walls), "vectorized graph differs from scalar graph"
+    assert attach_endpoints(graph, wall_array, start_point, end_point) == \
+        scalar_attach(graph, walls, start_point, end_point), "vectorized attach differs from scalar attach"
+
+    print(f"Visibility graph ({len(waypoints)} waypoints, {len(walls)} walls)")
+    scalar = timeit(lambda: scalar_waypoint_graph(waypoints, walls), repeat)
+    vectorized = timeit(lambda: build_waypoint_graph(waypoints, wall_array), repeat)
+    report("build_waypoint_graph (scalar)", scalar)
+    report("build_waypoint_graph (vectorized)", vectorized)
+    print(f"  speedup: {scalar / vectorized:.1f}x")
+
+    scalar = timeit(lambda: scalar_attach(graph, walls, start_point, end_point), repeat)
+    vectorized = timeit(lambda: attach_endpoints(graph, wall_array, start_point, end_point), repeat)
+    report("attach_endpoints (scalar)", scalar)
+    report("attach_endpoints (vectorized)", vectorized)
+    print(f"  speedup: {scalar / vectorized:.1f}x")
+
+
+def bench_route_table(floor_map, repeat):
+    floor_name = floor_map.floor_name
+    start_pose = (130.0, 350.0, 90.0)
+    get_route_table(floor_map)
+
+    print(f"Route queries ({len(floor_map.destinations)} destinations)")
+    for destination in sorted(floor_map.destinations):
+        search = timeit(lambda: find_optimal_path(floor_name, start_pose, destination), repeat)
+        table = timeit(lambda: find_optimal_path(floor_name, start_pose, destination, use_route_table=True), repeat)
+        report(f"{destination} (A*)", search)
+        report(f"{destination} (route table)", table)
+
+
+def bench_backends(floor_map, repeat):
+    floor_name = floor_map.floor_name
+    start_pose = (130.0, 350.0, 90.0)
+    grid = get_occupancy_grid(floor_map)
+
+    print(f"Backends (grid {grid.width}x{grid.height} cells of {grid.resolution:g} px)")
+    build = timeit(lambda: OccupancyGrid(floor_map.walls, grid.resolution, grid.clearance), max(1, repeat // 10))
+    report("OccupancyGrid build", build)
+    for destination in sorted(floor_map.destinations):
+        waypoints = timeit(lambda: find_optimal_path(floor_name, start_pose, destination), repeat)
+        jps = timeit(lambda: find_optimal_path(floor_name, start_pose, destination, backend="grid"), repeat)
+        report(f"{destination} (waypoint graph)", waypoints)
+        report(f"{destination} (grid JPS)", jps)
+
+
+def bench_batch(floor_map, repeat, count=100):
+    floor_name = floor_map.floor_name
+    destination = sorted(floor_map.destinations)[-1]
+    destination_angle = floor_map.destinations[destination][2]
+    rng = random.Random(0)
+    # Starts next to the waypoints, so most of them are routable
+    start_poses = [(x + rng.uniform(-15, 15), y + rng.uniform(-15, 15), rng.uniform(-180, 180))
+                   for x, y in (rng.choice(floor_map.waypoints) for _ in range(count))]
+
+    def one_by_one():
+        for pose in start_poses:
+            path = find_optimal_path(floor_name, pose, destination)
+            if path is not None:
+                generate_directions(pose, path, destination_angle)
+
+    print(f"Batch routes ({count} starts to {destination})")
+    report("find_optimal_path per start", timeit(one_by_one, max(1, repeat // 10)))
+    report("find_optimal_paths_to", timeit(lambda: find_optimal_paths_to(floor_name, destination, start_poses),
+                                           max(1, repeat // 10)))
+
+
+def bench_route_cache(floor_map, repeat, count=100):
+    floor_name = floor_map.floor_name
+    destinations = sorted(floor_map.destinations)
+    rng = random.Random(1)
+    # Users gathered around a few spots (doorways, tags) asking for a few destinations
+    spots = rng.sample(floor_map.waypoints, min(4, len(floor_map.waypoints)))
+    queries = [((x + rng.uniform(-8, 8), y + rng.uniform(-8, 8), rng.uniform(-180, 180)), rng.choice(destinations[:3]))
+               for x, y in (rng.choice(spots) for _ in range(count))]
+
+    def uncached():
+        for pose, destination in queries:
+            path = find_optimal_path(floor_name, pose, destination)
+            if path is not None:
+                generate_directions(pose, path, floor_map.destinations[destination][2])
+
+    cache = RouteCache()
+
+    def cached():
+        for pose, destination in queries:
+            cache.route(floor_name, pose, destination)
+
+    print(f"Route cache ({count} queries around {len(spots)} spots)")
+    report("find_optimal_path + directions", timeit(uncached, max(1, repeat // 10)))
+    report("RouteCache.route", timeit(cached, max(1, repeat // 10)))
+    print(f"  {cache.stats()}")
+
+
+# Function to sample poses walking along a path, with some noise on the position
+def walk(path, step, noise, rng):
+    poses = []
+    for (x1, y1), (x2, y2) in zip(path, path[1:]):
+        heading = math.degrees(math.atan2(y2 - y1, x2 - x1))
+        steps = max(1, int(math.hypot(x2 - x1, y2 - y1) / step))
+        for i in range(steps):
+            t = i / steps
+            poses.append((x1 + t * (x2 - x1) + rng.gauss(0, noise), y1 + t * (y2 - y1) + rng.gauss(0, noise),
+                          heading + rng.gauss(0, 10)))
+    return poses
+
+
+def bench_session(floor_map, repeat):
+    floor_name = floor_map.floor_name
+    destination = sorted(floor_map.destinations)[0]
+    start = (130.0, 350.0, 0.0)
+    path = find_optimal_path(floor_name, start, destination)
+    if path is None:
+        return
+    poses = walk(path, step=4.0, noise=3.0, rng=random.Random(2))
+
+    def per_pose_search():
+        for pose in poses:
+            find_optimal_path(floor_name, pose, destination)
+
+    def per_pose_session():
+        session = NavigationSession(floor_name, destination)
+        for pose in poses:
+            session.update(pose)
+        return session
+
+    session = per_pose_session()
+    print(f"Navigation session ({len(poses)} poses along a route, {session.replans} plans)")
+    report("find_optimal_path per pose", timeit(per_pose_search, max(1, repeat // 10)) / len(poses))
+    report("NavigationSession.update", timeit(per_pose_session, repeat) / len(poses))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pathfinder micro-benchmarks")
+    parser.add_argument("--floor", default="basic-floor-plan")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    floor_map = map_store.get(args.floor)
+    if floor_map is None:
+        return
+    bench_visibility(floor_map, args.repeat)
+    bench_route_table(floor_map, args.repeat)
+    bench_backends(floor_map, args.repeat)
+    bench_batch(floor_map, args.repeat)
+    bench_route_cache(floor_map, args.repeat)
+    bench_session(floor_map, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import json
+import os
+import threading
+from map_store import DATA_PATH, map_store
+from pathfinder import attach_points, dijkstra, find_optimal_path, get_wall_array, get_waypoint_graph
+
+CONNECTORS_FILE = os.path.join(DATA_PATH, "connectors.json")
+
+START = ("start",)
+GOAL = ("goal",)
+
+
+# Function to walk dijkstra's back-pointers from a node to the search source
+def trace(towards_source, node):
+    path = []
+    while node is not None:
+        path.append(node)
+        node = towards_source[node]
+    return path
+
+
+class Connector:
+    def __init__(self, name, kind, stops, transfer_cost):
+        self.name = name
+        self.kind = kind
+        self.stops = stops                  # [(floor_name, destination name or (x, y)), ...] in floor order
+        self.transfer_cost = transfer_cost  # map units per move between consecutive stops
+
+
+class BuildingRouter:
+    """
+    Routes between floors through declared connectors such as stairs and elevators.
+
+    Connectors are read from data/connectors.json, with their stops in floor order:
+
+        {"connectors": [
+            {"name": "Main stairs", "type": "stairs", "transfer_cost": 400,
+             "stops": [["floor-1", "Stairs"], ["floor-2", [120, 80]]]}
+        ]}
+
+    A stop is either a destination name on that floor or an (x, y) point. Each floor
+    keeps a table of connector-to-connector paths, so a cross-floor query is one search
+    from the start, one from the destination and a search over a graph of connectors.
+    """
+    def __init__(self, store=None, connectors_file=CONNECTORS_FILE):
+        self.store = store or map_store
+        self.connectors_file = connectors_file
+        self._connectors = []
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def connectors(self):
+        """
+        Returns the declared connectors, reloading the file when its mtime changes.
+        """
+        try:
+            mtime = os.stat(self.connectors_file).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._connectors = self._load_connectors() if mtime is not None else []
+                    self._mtime = mtime
+        return self._connectors
+
+    def _load_connectors(self):
+        with open(self.connectors_file, "r") as f:
+            data = json.load(f)
+        return [
+            Connector(c["name"], c.get("type", "stairs"),
+                      [(floor, stop if isinstance(stop, str) else tuple(stop)) for floor, stop in c["stops"]],
+                      float(c.get("transfer_cost", 0.0)))
+            for c in data.get("connectors", [])
+        ]
+
+    def floor_connectors(self, floor_map):
+        """
+        Returns {connector name: (x, y)} for the connectors that stop on this floor.
+        """
+        points = {}
+        for connector in self.connectors():
+            for floor, stop in connector.stops:
+                if floor != floor_map.floor_name:
+                    continue
+                if isinstance(stop, str):
+                    if stop not in floor_map.destinations:
+                        raise ValueError(f"Connector {connector.name} refers to unknown destination {stop}.")
+                    stop = floor_map.destinations[stop][:2]
+                points[connector.name] = tuple(stop)
+        return points
+
+    def _connector_table(self, floor_map):
+        # Cached on the floor map, keyed by the connectors file version
+        def build():
+            points = self.floor_connectors(floor_map)
+            graph = attach_points(get_waypoint_graph(floor_map), get_wall_array(floor_map), list(points.values()))
+            table = {}
+            for name_a, point_a in points.items():
+                dist, towards_source = dijkstra(graph, point_a)
+                for name_b, point_b in points.items():
+                    if name_a != name_b and point_b in dist:
+                        table[(name_a, name_b)] = (dist[point_b], trace(towards_source, point_b)[::-1])
+            return table
+        return floor_map.cached(("connector_table", self._mtime), build)
+
+    def _floor_search(self, floor_map, point):
+        # One Dijkstra from `point` reaching every connector of the floor
+        points = self.floor_connectors(floor_map)
+        graph = attach_points(get_waypoint_graph(floor_map), get_wall_array(floor_map),
+                              [point] + list(points.values()))
+        dist, towards_source = dijkstra(graph, point)
+        reached = {name: (dist[p], trace(towards_source, p)) for name, p in points.items() if p in dist}
+        return reached
+
+    def _get_floor(self, floor_name):
+        floor_map = self.store.get(floor_name)
+        if floor_map is None:
+            raise ValueError(f"No map data found for floor {floor_name}.")
+        return floor_map
+
+    def route(self, start_floor, start_pose, end_floor, end_point):
+        """
+        Finds a route from a pose on one floor to a destination name or (x, y) point on another.
+
+        Returns:
+            list: Legs {"floor", "path", "connector"}, where "connector" is the connector
+            taken at the end of the leg (None for the last leg), or None if there is no route.
+        """
+        if start_floor == end_floor:
+            path = find_optimal_path(start_floor, start_pose, end_point, store=self.store)
+            return None if path is None else [{"floor": start_floor, "path": path, "connector": None}]
+
+        start_map = self._get_floor(start_floor)
+        end_map = self._get_floor(end_floor)
+        if isinstance(end_point, str) and end_point in end_map.destinations:
+            end_point = end_map.destinations[end_point][:2]
+        elif not isinstance(end_point, tuple):
+            raise ValueError("End point must be a tuple of coordinates or a valid destination name.")
+        start_point = (start_pose[0], start_pose[1])
+
+        # Top-level graph: start, goal and one node per connector stop
+        top = {START: {}, GOAL: {}}
+        legs = {}
+        for name, (cost, path) in self._floor_search(start_map, start_point).items():
+            top[START][(start_floor, name)] = cost
+            legs[(START, (start_floor, name))] = path[::-1]
+        for name, (cost, path) in self._floor_search(end_map, end_point).items():
+            top.setdefault((end_floor, name), {})[GOAL] = cost
+            legs[((end_floor, name), GOAL)] = path
+        for connector in self.connectors():
+            for (floor_a, _), (floor_b, _) in zip(connector.stops, connector.stops[1:]):
+                for u, v in (((floor_a, connector.name), (floor_b, connector.name)),
+                             ((floor_b, connector.name), (floor_a, connector.name))):
+                    top.setdefault(u, {})[v] = connector.transfer_cost
+        for floor in {floor for c in self.connectors() for floor, _ in c.stops}:
+            for (name_a, name_b), (cost, path) in self._connector_table(self._get_floor(floor)).items():
+                top.setdefault((floor, name_a), {})[(floor, name_b)] = cost
+                legs[((floor, name_a), (floor, name_b))] = path
+
+        dist, towards_start = dijkstra(top, START)
+        if GOAL not in dist:
+            print(f"No path found: No connector route from {start_floor} to {end_floor}.")
+            return None
+
+        # Merge consecutive same-floor hops into one leg per floor visit
+        nodes = trace(towards_start, GOAL)[::-1]
+        result = []
+        for u, v in zip(nodes, nodes[1:]):
+            if (u, v) not in legs:
+                # Transfer between floors: the current leg ends at this connector
+                result[-1]["connector"] = u[1]
+                continue
+            floor = v[0] if v != GOAL else end_floor
+            path = legs[(u, v)]
+            if result and result[-1]["floor"] == floor and result[-1]["connector"] is None:
+                result[-1]["path"].extend(path[1:])
+            else:
+                result.append({"floor": floor, "path": list(path), "connector": None})
+        return result
+
+
+# Shared router using the shared map store
+building_router = BuildingRouter()
@@ -0,0 +1,228 @@
+import heapq
+import json
+import math
+import os
+import numpy as np
+from grid_planner import GRID_CLEARANCE, GRID_RESOLUTION, SQRT2, get_occupancy_grid
+
+# Step directions of the next-step field; index 8 means the destination cell
+DIRECTIONS = [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)]
+HEADINGS = [math.degrees(math.atan2(dy, dx)) for dx, dy in DIRECTIONS]
+ARRIVED = 8
+UNREACHABLE = -1
+
+# Distances are stored as uint16 counts of `resolution / DIST_STEPS` map units
+DIST_STEPS = 8
+DIST_MAX = np.iinfo(np.uint16).max
+
+
+# Function to run Dijkstra over the grid from the destination cell
+def distance_field(grid, goal_cell):
+    """
+    Returns the geodesic distance (in cells) from every cell to `goal_cell`, and the
+    index into DIRECTIONS of the first step towards it. Moves follow the same rules as
+    JumpPointSearch: 8-connected, diagonals only when both straight cells are free.
+    """
+    height, width = grid.height, grid.width
+    free = grid.free
+    dist = np.full((height, width), np.inf)
+    next_step = np.full((height, width), UNREACHABLE, dtype=np.int8)
+    if goal_cell is None:
+        return dist, next_step
+
+    # The step from a neighbour back into the current cell is the reverse direction
+    moves = [(dx, dy, (k + 4) % 8, SQRT2 if dx and dy else 1.0) for k, (dx, dy) in enumerate(DIRECTIONS)]
+    costs = {goal_cell: 0.0}
+    queue = [(0.0, goal_cell)]
+    gx, gy = goal_cell
+    next_step[gy, gx] = ARRIVED
+    while queue:
+        cost, (x, y) = heapq.heappop(queue)
+        if cost > costs[(x, y)]:
+            continue
+        dist[y, x] = cost
+        for dx, dy, back, step in moves:
+            nx, ny = x + dx, y + dy
+            if not (0 <= nx < width and 0 <= ny < height) or not free[ny][nx]:
+                continue
+            if dx and dy and not (free[y][nx] and free[ny][x]):
+                continue
+            new_cost = cost + step
+            if new_cost < costs.get((nx, ny), math.inf):
+                costs[(nx, ny)] = new_cost
+                next_step[ny, nx] = back
+                heapq.heappush(queue, (new_cost, (nx, ny)))
+    return dist, next_step
+
+
+class FlowField:
+    """
+    Distance and next-step fields towards one destination, usually memory-mapped from disk.
+    Poses are in map coordinates (the same frame as the walls and waypoints).
+    """
+    def __init__(self, dist, next_step, origin, resolution, goal):
+        self.dist = dist                # (H, W) uint16, DIST_MAX where unreachable
+        self.next_step = next_step      # (H, W) int8 index into DIRECTIONS
+        self.goal = goal                # exact (x, y) of the destination
+        self.origin = origin
+        self.resolution = resolution
+        self.height, self.width = next_step.shape
+
+    def _cell(self, x, y):
+        cx = int((x - self.origin[0]) // self.resolution)
+        cy = int((y - self.origin[1]) // self.resolution)
+        if 0 <= cx < self.width and 0 <= cy < self.height:
+            return cx, cy
+        return None
+
+    def distance(self, x, y):
+        """
+        Returns the remaining path length in map units, or None if the destination is unreachable.
+        """
+        cell = self._cell(x, y)
+        if cell is None:
+            return None
+        value = int(self.dist[cell[1], cell[0]])
+        if value == DIST_MAX:
+            return None
+        return value * self.resolution / DIST_STEPS
+
+    def heading(self, x, y):
+        """
+        Returns the map angle (degrees) of the next step, or None if the destination
+        cannot be reached from here. Inside the destination cell it points at the exact goal.
+        """
+        cell = self._cell(x, y)
+        if cell is None:
+            return None
+        step = int(self.next_step[cell[1], cell[0]])
+        if step == UNREACHABLE:
+            return None
+        if step == ARRIVED:
+            return math.degrees(math.atan2(self.goal[1] - y, self.goal[0] - x))
+        return HEADINGS[step]
+
+    def guidance(self, pose):
+        """
+        Returns (relative_angle, distance) for a pose (x, y, yaw in degrees), or None.
+        relative_angle is in (-180, 180], positive to the right like message.message.
+        """
+        x, y, yaw = pose[:3]
+        heading = self.heading(x, y)
+        if heading is None:
+            return None
+        relative_angle = (heading - yaw + 180.0) % 360.0 - 180.0
+        return relative_angle, self.distance(x, y)
+
+
+class FlowFieldSet:
+    """
+    Lazily loads the flow fields of one floor. Fields saved by save_flow_fields are
+    memory-mapped; missing or outdated ones are computed in memory on first use.
+    """
+    def __init__(self, floor_map, grid):
+        self.floor_map = floor_map
+        self.grid = grid
+        self.directory = flow_field_dir(floor_map.map_file) if floor_map.map_file else None
+        self._fields = {}
+        self._on_disk = self._check_meta()
+
+    def _check_meta(self):
+        if self.directory is None:
+            return False
+        meta_file = os.path.join(self.directory, "meta.json")
+        if not os.path.exists(meta_file):
+            return False
+        with open(meta_file, "r") as f:
+            meta = json.load(f)
+        return (tuple(meta["version"]) == tuple(self.floor_map.version)
+                and meta["resolution"] == self.grid.resolution
+                and meta["clearance"] == self.grid.clearance)
+
+    def __getitem__(self, destination):
+        field = self._fields.get(destination)
+        if field is None:
+            field = self._fields[destination] = self._load(destination)
+        return field
+
+    def _load(self, destination):
+        if destination not in self.floor_map.destinations:
+            raise KeyError(destination)
+        origin = tuple(float(v) for v in self.grid.origin)
+        goal = tuple(self.floor_map.destinations[destination][:2])
+        if self._on_disk:
+            dist_file, next_file = field_files(self.directory, destination)
+            if os.path.exists(dist_file) and os.path.exists(next_file):
+                return FlowField(np.load(dist_file, mmap_mode="r"), np.load(next_file, mmap_mode="r"),
+                                 origin, self.grid.resolution, goal)
+        dist, next_step = compute_field(self.grid, self.floor_map.destinations[destination])
+        return FlowField(dist, next_step, origin, self.grid.resolution, goal)
+
+
+# Function to compute the compact fields for a destination (x, y, ...)
+def compute_field(grid, destination):
+    goal_cell = grid.nearest_free(grid.to_cell(destination[:2]), destination[:2])
+    dist, next_step = distance_field(grid, goal_cell)
+    counts = np.where(np.isfinite(dist), np.rint(dist * DIST_STEPS), DIST_MAX)
+    return np.minimum(counts, DIST_MAX).astype(np.uint16), next_step
+
+
+def flow_field_dir(map_file):
+    return os.path.splitext(map_file)[0] + ".fields"
+
+
+def field_files(directory, destination):
+    return (os.path.join(directory, f"{destination}.dist.npy"),
+            os.path.join(directory, f"{destination}.next.npy"))
+
+
+# Function to get the cached flow fields of a floor
+def get_flow_fields(floor_map, resolution=GRID_RESOLUTION, clearance=GRID_CLEARANCE):
+    return floor_map.cached(
+        ("flow_fields", resolution, clearance),
+        lambda: FlowFieldSet(floor_map, get_occupancy_grid(floor_map, resolution, clearance)),
+    )
+
+
+# Function to precompute and save the flow fields of every destination on a floor
+def save_flow_fields(floor_map, grid):
+    directory = flow_field_dir(floor_map.map_file)
+    os.makedirs(directory, exist_ok=True)
+    for name, destination in floor_map.destinations.items():
+        dist, next_step = compute_field(grid, destination)
+        dist_file, next_file = field_files(directory, name)
+        np.save(dist_file, dist)
+        np.save(next_file, next_step)
+    meta = {
+        "version": list(floor_map.version),
+        "resolution": grid.resolution,
+        "clearance": grid.clearance,
+        "origin": [float(v) for v in grid.origin],
+        "shape": [grid.height, grid.width],
+        "dist_steps": DIST_STEPS,
+        "destinations": sorted(floor_map.destinations),
+    }
+    with open(os.path.join(directory, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=4)
+    return directory
+
+
+def main():
+    import argparse
+    from map_store import map_store
+
+    parser = argparse.ArgumentParser(description="Precompute the flow fields of a floor")
+    parser.add_argument("floor", help="Floor name, e.g. basic-floor-plan")
+    parser.add_argument("--resolution", type=float, default=GRID_RESOLUTION)
+    parser.add_argument("--clearance", type=float, default=GRID_CLEARANCE)
+    args = parser.parse_args()
+
+    floor_map = map_store.get(args.floor)
+    if floor_map is None:
+        return
+    directory = save_flow_fields(floor_map, get_occupancy_grid(floor_map, args.resolution, args.clearance))
+    print(f"Saved flow fields to {directory}")
+
+
+if __name__ == "__main__":
+    main()
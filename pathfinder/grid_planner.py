@@ -0,0 +1,353 @@
+import heapq
+import math
+import time
+from collections import deque
+import numpy as np
+from visibility import as_segment_array, segments_clear
+
+# Defaults in map units (floorplan pixels)
+GRID_RESOLUTION = 5.0
+GRID_CLEARANCE = 10.0
+
+SQRT2 = math.sqrt(2)
+
+
+class OccupancyGrid:
+    """
+    Walls rasterized into a grid of `resolution`-sized cells, with every blocked
+    cell inflated by `clearance` so planned paths keep away from the walls.
+    """
+    def __init__(self, walls, resolution=GRID_RESOLUTION, clearance=GRID_CLEARANCE, points=()):
+        self.resolution = float(resolution)
+        self.clearance = float(clearance)
+
+        coords = [p for wall in walls for p in wall] + [tuple(p[:2]) for p in points]
+        if coords:
+            coords = np.asarray(coords, dtype=np.float64)
+            low, high = coords.min(axis=0), coords.max(axis=0)
+        else:
+            low, high = np.zeros(2), np.zeros(2)
+        margin = self.clearance + 2 * self.resolution
+        self.origin = low - margin
+        self.width = int(math.ceil((high[0] - self.origin[0] + margin) / self.resolution)) + 1
+        self.height = int(math.ceil((high[1] - self.origin[1] + margin) / self.resolution)) + 1
+
+        self.wall_segments = as_segment_array(walls)
+        self.walls_mask = self._rasterize(walls)
+        self.blocked = self._inflate(self.walls_mask)
+        # Nested lists are much faster than NumPy indexing for one cell at a time
+        self.free = (~self.blocked).tolist()
+        self.wall_cells = self.walls_mask.tolist()
+
+    def _rasterize(self, walls):
+        mask = np.zeros((self.height, self.width), dtype=bool)
+        for (x1, y1), (x2, y2) in walls:
+            # Sample at half-cell steps so no cell along the wall is skipped
+            steps = int(math.ceil(math.hypot(x2 - x1, y2 - y1) / (0.5 * self.resolution))) + 1
+            t = np.linspace(0.0, 1.0, steps + 1)
+            cx = np.floor((x1 + (x2 - x1) * t - self.origin[0]) / self.resolution).astype(int)
+            cy = np.floor((y1 + (y2 - y1) * t - self.origin[1]) / self.resolution).astype(int)
+            mask[cy, cx] = True
+        return mask
+
+    def _inflate(self, mask):
+        radius = self.clearance / self.resolution
+        r = int(math.ceil(radius))
+        if r == 0:
+            return mask.copy()
+        inflated = mask.copy()
+        for dy in range(-r, r + 1):
+            for dx in range(-r, r + 1):
+                if dx * dx + dy * dy > radius * radius or (dx == 0 and dy == 0):
+                    continue
+                src = mask[max(0, -dy):self.height - max(0, dy), max(0, -dx):self.width - max(0, dx)]
+                inflated[max(0, dy):self.height - max(0, -dy), max(0, dx):self.width - max(0, -dx)] |= src
+        return inflated
+
+    def to_cell(self, point):
+        return (int(math.floor((point[0] - self.origin[0]) / self.resolution)),
+                int(math.floor((point[1] - self.origin[1]) / self.resolution)))
+
+    def to_point(self, cell):
+        return (float(self.origin[0] + (cell[0] + 0.5) * self.resolution),
+                float(self.origin[1] + (cell[1] + 0.5) * self.resolution))
+
+    def is_free(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height and self.free[y][x]
+
+    def nearest_free(self, cell, point=None):
+        """
+        Returns the closest free cell to `cell` (breadth-first), or None if there is none.
+
+        The search only moves through clearance cells, never through the wall cells
+        themselves, so the free cell is on the same side of the walls as `cell`. With a
+        map `point` (inside `cell`), the free cell's centre must also be in its line of sight.
+        """
+        if self.is_free(*cell) and (point is None or self.point_sees_cell(point, cell)):
+            return cell
+        seen = {cell}
+        queue = deque([cell])
+        while queue:
+            x, y = queue.popleft()
+            for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                if (nx, ny) in seen or not (0 <= nx < self.width and 0 <= ny < self.height):
+                    continue
+                seen.add((nx, ny))
+                if self.wall_cells[ny][nx]:
+                    continue
+                if self.free[ny][nx] and (point is None or self.point_sees_cell(point, (nx, ny))):
+                    return (nx, ny)
+                queue.append((nx, ny))
+        return None
+
+    def point_sees_cell(self, point, cell):
+        """
+        True if the segment from a map point to the centre of `cell` crosses no wall.
+        """
+        return bool(segments_clear([(tuple(point[:2]), self.to_point(cell))], self.wall_segments)[0])
+
+    def line_of_sight(self, cell_a, cell_b):
+        """
+        True if every cell the line between the two cell centres passes through is free.
+        Where the line crosses a cell corner exactly, both side cells must be free.
+        """
+        x, y = cell_a
+        x1, y1 = cell_b
+        dx, dy = x1 - x, y1 - y
+        step_x = (dx > 0) - (dx < 0)
+        step_y = (dy > 0) - (dy < 0)
+        # Parametric distance to the next vertical / horizontal cell border
+        t_delta_x = abs(1.0 / dx) if dx else math.inf
+        t_delta_y = abs(1.0 / dy) if dy else math.inf
+        t_max_x = 0.5 * t_delta_x
+        t_max_y = 0.5 * t_delta_y
+        if not self.is_free(x, y):
+            return False
+        while (x, y) != (x1, y1):
+            if abs(t_max_x - t_max_y) < 1e-12:
+                if not (self.is_free(x + step_x, y) and self.is_free(x, y + step_y)):
+                    return False
+                x += step_x
+                y += step_y
+                t_max_x += t_delta_x
+                t_max_y += t_delta_y
+            elif t_max_x < t_max_y:
+                x += step_x
+                t_max_x += t_delta_x
+            else:
+                y += step_y
+                t_max_y += t_delta_y
+            if not self.is_free(x, y):
+                return False
+        return True
+
+
+def octile(a, b):
+    dx = abs(a[0] - b[0])
+    dy = abs(a[1] - b[1])
+    return (SQRT2 - 1) * min(dx, dy) + max(dx, dy)
+
+
+class JumpPointSearch:
+    """
+    Jump Point Search on an 8-connected OccupancyGrid. Diagonal moves are only
+    allowed when both adjacent straight cells are free, so paths never cut wall corners.
+    """
+    def __init__(self, grid):
+        self.grid = grid
+
+    def _jump(self, x, y, dx, dy, goal):
+        is_free = self.grid.is_free
+        while True:
+            if not is_free(x, y):
+                return None
+            if (x, y) == goal:
+                return (x, y)
+            if dx and dy:
+                # A diagonal jump stops where a straight jump would find something
+                if self._jump(x + dx, y, dx, 0, goal) or self._jump(x, y + dy, 0, dy, goal):
+                    return (x, y)
+            elif dx:
+                if (is_free(x, y - 1) and not is_free(x - dx, y - 1)) or \
+                        (is_free(x, y + 1) and not is_free(x - dx, y + 1)):
+                    return (x, y)
+            else:
+                if (is_free(x - 1, y) and not is_free(x - 1, y - dy)) or \
+                        (is_free(x + 1, y) and not is_free(x + 1, y - dy)):
+                    return (x, y)
+            if not (is_free(x + dx, y) and is_free(x, y + dy)):
+                return None
+            x += dx
+            y += dy
+
+    def _neighbors(self, node, parent):
+        is_free = self.grid.is_free
+        x, y = node
+        if parent is None:
+            result = []
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    if (dx or dy) and is_free(x + dx, y + dy) and \
+                            (not (dx and dy) or (is_free(x + dx, y) and is_free(x, y + dy))):
+                        result.append((x + dx, y + dy))
+            return result
+
+        dx = (x > parent[0]) - (x < parent[0])
+        dy = (y > parent[1]) - (y < parent[1])
+        result = []
+        if dx and dy:
+            walk_x = is_free(x + dx, y)
+            walk_y = is_free(x, y + dy)
+            if walk_y:
+                result.append((x, y + dy))
+            if walk_x:
+                result.append((x + dx, y))
+            if walk_x and walk_y:
+                result.append((x + dx, y + dy))
+        elif dx:
+            ahead = is_free(x + dx, y)
+            up = is_free(x, y - 1)
+            down = is_free(x, y + 1)
+            if ahead:
+                result.append((x + dx, y))
+                if up:
+                    result.append((x + dx, y - 1))
+                if down:
+                    result.append((x + dx, y + 1))
+            if up:
+                result.append((x, y - 1))
+            if down:
+                result.append((x, y + 1))
+        else:
+            ahead = is_free(x, y + dy)
+            left = is_free(x - 1, y)
+            right = is_free(x + 1, y)
+            if ahead:
+                result.append((x, y + dy))
+                if left:
+                    result.append((x - 1, y + dy))
+                if right:
+                    result.append((x + 1, y + dy))
+            if left:
+                result.append((x - 1, y))
+            if right:
+                result.append((x + 1, y))
+        return result
+
+    def search(self, start, goal, stats=None):
+        """
+        Returns the list of jump-point cells from start to goal, or None if there is no path.
+        """
+        started = time.perf_counter()
+        came_from = {start: None}
+        cost_so_far = {start: 0.0}
+        closed = set()
+        queue = [(octile(start, goal), start)]
+        found = False
+
+        while queue:
+            _, current = heapq.heappop(queue)
+            if current in closed:
+                if stats is not None:
+                    stats.stale_pops += 1
+                continue
+            if current == goal:
+                found = True
+                break
+            closed.add(current)
+            if stats is not None:
+                stats.nodes_expanded += 1
+
+            for neighbor in self._neighbors(current, came_from[current]):
+                jump_point = self._jump(neighbor[0], neighbor[1], neighbor[0] - current[0],
+                                        neighbor[1] - current[1], goal)
+                if jump_point is None or jump_point in closed:
+                    continue
+                new_cost = cost_so_far[current] + octile(current, jump_point)
+                if jump_point not in cost_so_far or new_cost < cost_so_far[jump_point]:
+                    cost_so_far[jump_point] = new_cost
+                    came_from[jump_point] = current
+                    heapq.heappush(queue, (new_cost + octile(jump_point, goal), jump_point))
+                    if stats is not None:
+                        stats.heap_pushes += 1
+
+        if stats is not None:
+            stats.elapsed = time.perf_counter() - started
+            stats.status = "found" if found else "unreachable"
+            stats.cost = cost_so_far[goal] * self.grid.resolution if found else None
+        if not found:
+            return None
+
+        path = []
+        current = goal
+        while current is not None:
+            path.append(current)
+            current = came_from[current]
+        path.reverse()
+        return path
+
+
+# Function to drop every cell that can be skipped with a straight, collision-free line
+def smooth_path(grid, cells):
+    if len(cells) <= 2:
+        return list(cells)
+    smoothed = [cells[0]]
+    anchor = 0
+    while anchor < len(cells) - 1:
+        furthest = anchor + 1
+        for i in range(len(cells) - 1, anchor + 1, -1):
+            if grid.line_of_sight(cells[anchor], cells[i]):
+                furthest = i
+                break
+        smoothed.append(cells[furthest])
+        anchor = furthest
+    return smoothed
+
+
+# Function to get the cached occupancy grid of a floor
+def get_occupancy_grid(floor_map, resolution=GRID_RESOLUTION, clearance=GRID_CLEARANCE):
+    points = list(floor_map.waypoints) + list(floor_map.destinations.values())
+    return floor_map.cached(
+        ("occupancy_grid", resolution, clearance),
+        lambda: OccupancyGrid(floor_map.walls, resolution, clearance, points),
+    )
+
+
+# Function to plan a path between two map points on an occupancy grid
+def grid_path(grid, start_point, end_point, stats=None):
+    start_cell = grid.nearest_free(grid.to_cell(start_point), start_point)
+    goal_cell = grid.nearest_free(grid.to_cell(end_point), end_point)
+    if start_cell is None or goal_cell is None:
+        if stats is not None:
+            stats.status = "unreachable"
+        return None
+
+    cells = JumpPointSearch(grid).search(start_cell, goal_cell, stats)
+    if cells is None:
+        return None
+    cells = smooth_path(grid, cells)
+
+    # Keep the exact start and end points, with the grid cell centres in between. An end
+    # point that cannot see the next centre goes through its own (snapped) cell instead
+    inner = [grid.to_point(cell) for cell in cells[1:-1]]
+    path = [start_point]
+    if not _leg_clear(grid, start_point, inner[0] if inner else end_point):
+        path.append(grid.to_point(cells[0]))
+    path.extend(inner)
+    if end_point != start_point:
+        goal_centre = grid.to_point(cells[-1])
+        if path[-1] != goal_centre and not _leg_clear(grid, path[-1], end_point):
+            path.append(goal_centre)
+        path.append(end_point)
+
+    # The legs between cell centres are clear by construction, and nearest_free only picks
+    # cells the end points can see; check the legs against the walls all the same
+    legs = np.asarray(list(zip(path, path[1:])), dtype=np.float64).reshape(-1, 2, 2)
+    if not segments_clear(legs, grid.wall_segments).all():
+        if stats is not None:
+            stats.status = "unreachable"
+        return None
+    return path
+
+def _leg_clear(grid, point_a, point_b):
+    return bool(segments_clear([(point_a, point_b)], grid.wall_segments)[0])
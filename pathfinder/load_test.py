@@ -0,0 +1,91 @@
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+import numpy as np
+from map_store import map_store
+
+
+# Function to make random route queries starting near the waypoints of a floor
+def make_queries(floor_map, count, rng, jitter=10.0):
+    destinations = sorted(floor_map.destinations)
+    queries = []
+    for _ in range(count):
+        x, y = rng.choice(floor_map.waypoints)[:2]
+        queries.append({
+            "floor": floor_map.floor_name,
+            "start": [x + rng.uniform(-jitter, jitter), y + rng.uniform(-jitter, jitter), rng.uniform(-180, 180)],
+            "destination": rng.choice(destinations),
+        })
+    return queries
+
+
+def worker(host, port, bodies, keep_alive, latencies, errors):
+    connection = http.client.HTTPConnection(host, port)
+    for body in bodies:
+        start = time.perf_counter()
+        try:
+            connection.request("POST", "/routes", body, {"Content-Type": "application/json"})
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(str(e))
+            connection.close()
+            connection = http.client.HTTPConnection(host, port)
+            continue
+        latencies.append(time.perf_counter() - start)
+        if not keep_alive:
+            # Reconnect for every request to measure the cost of not reusing connections
+            connection.close()
+            connection = http.client.HTTPConnection(host, port)
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for route_server.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--floor", default="basic-floor-plan")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent connections")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per client")
+    parser.add_argument("--batch", type=int, default=10, help="Route queries per request")
+    parser.add_argument("--no-keep-alive", action="store_true", help="Open a new connection for every request")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    floor_map = map_store.get(args.floor)
+    if floor_map is None:
+        return
+    rng = random.Random(args.seed)
+    per_client = [[json.dumps({"queries": make_queries(floor_map, args.batch, rng)}) for _ in range(args.requests)]
+                  for _ in range(args.clients)]
+
+    latencies = []
+    errors = []
+    threads = [threading.Thread(target=worker, args=(args.host, args.port, bodies, not args.no_keep_alive,
+                                                     latencies, errors))
+               for bodies in per_client]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    if not latencies:
+        print(f"No successful requests ({len(errors)} errors)")
+        return
+    ms = np.array(latencies) * 1e3
+    print(f"{len(latencies)} requests x {args.batch} routes, {args.clients} clients, "
+          f"keep-alive {'off' if args.no_keep_alive else 'on'}, {len(errors)} errors")
+    print(f"  p50 {np.percentile(ms, 50):8.2f} ms")
+    print(f"  p99 {np.percentile(ms, 99):8.2f} ms")
+    print(f"  {len(latencies) / elapsed:.1f} requests/s, {len(latencies) * args.batch / elapsed:.1f} routes/s")
+
+
+if __name__ == "__main__":
+    main()
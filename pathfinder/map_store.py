@@ -0,0 +1,121 @@
+import json
+import os
+import threading
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+
+class FloorMap:
+    """
+    In-memory map data for one floor.
+
+    Anything derived from the map (graphs, indexes, tables) is kept in `cache`,
+    so it is dropped together with the map when the files change on disk.
+    """
+    def __init__(self, floor_name, walls, waypoints, destinations, version, map_file=None):
+        self.floor_name = floor_name
+        self.map_file = map_file
+        self.walls = walls
+        self.waypoints = waypoints
+        self.destinations = destinations
+        self.version = version
+        self.cache = {}
+
+    def cached(self, key, build):
+        """
+        Returns the value stored under `key`, calling `build()` to create it on first use.
+        """
+        try:
+            return self.cache[key]
+        except KeyError:
+            value = build()
+            self.cache[key] = value
+            return value
+
+
+class MapStore:
+    """
+    Loads each floor once and keeps it in memory, reloading only when the
+    map file or destinations.json has a new mtime.
+    """
+    def __init__(self, data_path=DATA_PATH):
+        self.data_path = data_path
+        self.dest_file = os.path.join(data_path, "destinations.json")
+        self._floors = {}
+        self._destinations = None
+        self._destinations_mtime = None
+        self._lock = threading.Lock()
+
+    def map_file(self, floor_name):
+        return os.path.join(self.data_path, "maps", floor_name + ".json")
+
+    def get(self, floor_name):
+        """
+        Returns the FloorMap for `floor_name`, or None if its files are missing.
+        """
+        map_file = self.map_file(floor_name)
+        try:
+            map_mtime = os.stat(map_file).st_mtime_ns
+        except FileNotFoundError:
+            print(f"Map file {map_file} not found.")
+            return None
+        try:
+            dest_mtime = os.stat(self.dest_file).st_mtime_ns
+        except FileNotFoundError:
+            print(f"Destinations file {self.dest_file} not found.")
+            return None
+
+        version = (map_mtime, dest_mtime)
+        floor_map = self._floors.get(floor_name)
+        if floor_map is not None and floor_map.version == version:
+            return floor_map
+
+        with self._lock:
+            # Another thread may have reloaded the floor while we waited
+            floor_map = self._floors.get(floor_name)
+            if floor_map is not None and floor_map.version == version:
+                return floor_map
+            floor_map = self._load_floor(floor_name, map_file, version)
+            self._floors[floor_name] = floor_map
+        return floor_map
+
+    def loaded(self):
+        """
+        Returns {floor_name: FloorMap} for the floors currently in memory.
+        """
+        return dict(self._floors)
+
+    def invalidate(self, floor_name=None):
+        """
+        Drops one floor (or every floor) so it is read again on the next get().
+        """
+        with self._lock:
+            if floor_name is None:
+                self._floors.clear()
+                self._destinations = None
+                self._destinations_mtime = None
+            else:
+                self._floors.pop(floor_name, None)
+
+    def _load_floor(self, floor_name, map_file, version):
+        with open(map_file, "r") as f:
+            data = json.load(f)
+        walls = [(tuple(wall[0]), tuple(wall[1])) for wall in data.get("walls", [])]
+        waypoints = [tuple(waypoint) for waypoint in data.get("waypoints", [])]
+
+        all_destinations = self._load_destinations(version[1])
+        # Load destinations for the current floor if available
+        destinations = {name: tuple(coords) for name, coords in all_destinations.get(floor_name, {}).items()}
+        return FloorMap(floor_name, walls, waypoints, destinations, version, map_file)
+
+    def _load_destinations(self, mtime):
+        # destinations.json holds every floor, so it is parsed once per mtime
+        if self._destinations is None or self._destinations_mtime != mtime:
+            with open(self.dest_file, "r") as f:
+                self._destinations = json.load(f)
+            self._destinations_mtime = mtime
+        return self._destinations
+
+
+# Shared store used by find_optimal_path and the GUI
+map_store = MapStore()
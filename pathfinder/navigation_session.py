@@ -0,0 +1,151 @@
+import math
+from map_store import map_store
+from message import generate_directions
+from pathfinder import connect_to_tree, get_goal_tree, get_wall_array, get_wall_index, line_is_clear, trace_tree
+
+# Distances in map units (the GUI draws 40 units per meter)
+CORRIDOR = 40.0             # how far the user may stray from the current leg
+ARRIVAL_RADIUS = 20.0       # a waypoint (or the destination) this close counts as reached
+RECHECK_DISTANCE = 8.0      # movement before the line of sight to the next waypoint is tested again
+
+
+# Function to get the distance from a point to the segment a-b
+def segment_distance(px, py, a, b):
+    ax, ay = a
+    dx = b[0] - ax
+    dy = b[1] - ay
+    length2 = dx * dx + dy * dy
+    t = 0.0 if length2 == 0 else max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length2))
+    return math.hypot(px - ax - t * dx, py - ay - t * dy)
+
+
+class NavigationSession:
+    """
+    Follows one user to one destination, replanning only when they leave the route.
+
+    update() costs a few arithmetic operations while the user stays within `corridor` of
+    the current leg, plus a line-of-sight test to the next waypoint every
+    `recheck_distance` of movement. When the user strays or loses sight of the next
+    waypoint, the route is rebuilt from the destination's shortest-path tree: the tree is
+    computed once per destination and map version (get_goal_tree) and shared by every
+    session, so a replan is a single batched visibility test from the pose to its nodes.
+    The map is only re-read on replans.
+    """
+    ON_ROUTE = "on_route"
+    ADVANCED = "advanced"
+    REPLANNED = "replanned"
+    ARRIVED = "arrived"
+    NO_PATH = "no_path"
+
+    def __init__(self, floor_name, destination, store=None, corridor=CORRIDOR, arrival_radius=ARRIVAL_RADIUS,
+                 recheck_distance=RECHECK_DISTANCE, scale=1.0):
+        """
+        Args:
+            floor_name (str): Floor to route on.
+            destination: Destination name from destinations.json, or an (x, y[, angle]) point.
+            corridor, arrival_radius, recheck_distance (float): Tolerances in map units.
+            scale (float): Map units to meters, passed to generate_directions.
+        """
+        self.store = store or map_store
+        self.floor_name = floor_name
+        self.destination = destination
+        self.corridor = corridor
+        self.arrival_radius = arrival_radius
+        self.recheck_distance = recheck_distance
+        self.scale = scale
+        self.path = None
+        self.next = 0
+        self.updates = 0
+        self.replans = 0
+        self._checked = None
+        self._load_floor()
+
+    def _load_floor(self):
+        floor_map = self.store.get(self.floor_name)
+        if floor_map is None:
+            raise ValueError(f"No map data found for floor {self.floor_name}.")
+        if isinstance(self.destination, str):
+            if self.destination not in floor_map.destinations:
+                raise ValueError(f"Unknown destination {self.destination}.")
+            end_x, end_y, self.destination_angle = floor_map.destinations[self.destination][:3]
+        else:
+            end_x, end_y = self.destination[:2]
+            self.destination_angle = self.destination[2] if len(self.destination) > 2 else None
+        self.end_point = (end_x, end_y)
+        self.floor_map = floor_map
+        self.goal_tree = get_goal_tree(floor_map, self.end_point)
+        self.walls = floor_map.walls
+        self.wall_index = get_wall_index(floor_map)
+
+    def replan(self, pose):
+        """
+        Rebuilds the route from `pose`, returning REPLANNED or NO_PATH.
+        """
+        self.replans += 1
+        if self.store.get(self.floor_name) is not self.floor_map:
+            self._load_floor()
+        first = connect_to_tree(self.goal_tree, get_wall_array(self.floor_map), [pose[:2]])[0]
+        if first < 0:
+            self.path = None
+            return self.NO_PATH
+        self.path = trace_tree(self.goal_tree, (pose[0], pose[1]), first)
+        self.next = 1
+        self._checked = (pose[0], pose[1])
+        return self.REPLANNED
+
+    def update(self, pose):
+        """
+        Takes a new (x, y, angle) pose and returns ON_ROUTE, ADVANCED (the next waypoint
+        changed), REPLANNED, ARRIVED or NO_PATH.
+        """
+        self.updates += 1
+        if self.path is None:
+            return self.replan(pose)
+        x, y = pose[0], pose[1]
+        path = self.path
+        last = len(path) - 1
+
+        # Move on past waypoints that are reached, or cut short when already on the next leg
+        advanced = False
+        while self.next < last:
+            target = path[self.next]
+            if math.hypot(x - target[0], y - target[1]) <= self.arrival_radius or \
+                    segment_distance(x, y, target, path[self.next + 1]) < \
+                    segment_distance(x, y, path[self.next - 1], target):
+                self.next += 1
+                advanced = True
+            else:
+                break
+        target = path[self.next]
+        if self.next == last and math.hypot(x - target[0], y - target[1]) <= self.arrival_radius:
+            return self.ARRIVED
+
+        if segment_distance(x, y, path[self.next - 1], target) > self.corridor:
+            return self.replan(pose)
+        checked = self._checked
+        if advanced or math.hypot(x - checked[0], y - checked[1]) >= self.recheck_distance:
+            if not line_is_clear((x, y), target, self.walls, self.wall_index):
+                return self.replan(pose)
+            self._checked = (x, y)
+        return self.ADVANCED if advanced else self.ON_ROUTE
+
+    def remaining(self, pose):
+        """
+        Returns the route from `pose` through the waypoints still ahead, or None.
+        """
+        if self.path is None:
+            return None
+        return [(pose[0], pose[1])] + self.path[self.next:]
+
+    def messages(self, pose):
+        """
+        Returns the generate_directions messages for the rest of the route from `pose`.
+        """
+        path = self.remaining(pose)
+        if path is None:
+            return None
+        angle = self.destination_angle
+        if angle is None:
+            (x1, y1), (x2, y2) = path[-2], path[-1]
+            angle = math.degrees(math.atan2(y2 - y1, x2 - x1))
+        return generate_directions(pose, path, angle, self.scale)
@@ -1,39 +1,28 @@
-import json
 import math
 import heapq
 import os
+import time
+import numpy as np
+from map_store import map_store
+from wall_index import WallGrid
+from visibility import as_segment_array, segments_clear
+from route_table import RouteTable, route_table_file
+from grid_planner import GRID_CLEARANCE, GRID_RESOLUTION, get_occupancy_grid, grid_path
+from message import generate_directions
 
 # Function to load map data
-def load_map_data(floor_name):
-    data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
-
-    # Check for corresponding JSON file
-    json_file = os.path.join(data_path, "maps", floor_name + ".json")
-    if os.path.exists(json_file):
-        with open(json_file, "r") as f:
-            data = json.load(f)
-            walls = [(tuple(wall[0]), tuple(wall[1])) for wall in data.get("walls", [])]
-            waypoints = [tuple(waypoint) for waypoint in data.get("waypoints", [])]
-        # print(f"Loaded map from {json_file}")
-    else:
-        print(f"Map file {json_file} not found.")
+def load_map_data(floor_name, store=None):
+    floor_map = (store or map_store).get(floor_name)
+    if floor_map is None:
         return
-    
-    dest_file = os.path.join(data_path, "destinations.json")
-    if os.path.exists(dest_file):
-        with open(dest_file, "r") as f:
-            all_destinations = json.load(f)
-        # Load destinations for the current floor if available
-        destinations = {name: tuple(coords) for name, coords in all_destinations.get(floor_name, {}).items()}
-    else:
-        print(f"Destinations file {dest_file} not found.")
-        return
-
-    return walls, waypoints, destinations
+    return floor_map.walls, floor_map.waypoints, floor_map.destinations
 
 
 # Function to check if a line intersects any walls
-def line_is_clear(point1, point2, walls):
+def line_is_clear(point1, point2, walls, index=None):
+    # With a wall index, only the walls near the line need the exact test
+    if index is not None:
+        walls = index.candidates(point1, point2)
     for wall in walls:
         if lines_intersect(point1, point2, wall[0], wall[1]):
             return False
@@ -52,27 +41,93 @@ def heuristic(a, b):
     return math.hypot(b[0] - a[0], b[1] - a[1])
 
 
+# Per-query counters filled in by a_star_search
+class SearchStats:
+    FOUND = "found"
+    UNREACHABLE = "unreachable"
+    BUDGET_EXCEEDED = "budget_exceeded"
+
+    def __init__(self):
+        self.status = None
+        self.cost = None
+        self.nodes_expanded = 0
+        self.heap_pushes = 0
+        self.stale_pops = 0
+        self.elapsed = 0.0
+
+    def as_dict(self):
+        return {
+            "status": self.status,
+            "cost": self.cost,
+            "nodes_expanded": self.nodes_expanded,
+            "heap_pushes": self.heap_pushes,
+            "stale_pops": self.stale_pops,
+            "elapsed": self.elapsed,
+        }
+
+
 # A* search algorithm
-def a_star_search(graph, start, goal):
+def a_star_search(graph, start, goal, max_expansions=None, time_budget=None, stats=None):
+    """
+    Finds the shortest path from start to goal.
+
+    Args:
+        graph (dict): {node: {neighbor: distance}}.
+        max_expansions (int): Give up after expanding this many nodes.
+        time_budget (float): Give up after this many seconds.
+        stats (SearchStats): Filled in with the outcome and search counters.
+
+    Returns:
+        list: The path from start to goal, or None if the goal is unreachable or the budget ran out.
+    """
+    if stats is None:
+        stats = SearchStats()
+    started = time.perf_counter()
+    deadline = None if time_budget is None else started + time_budget
+
     queue = []
     heapq.heappush(queue, (0, start))
+    stats.heap_pushes += 1
     came_from = {start: None}
     cost_so_far = {start: 0}
-    
+    closed = set()
+    stats.status = SearchStats.UNREACHABLE
+
     while queue:
         _, current = heapq.heappop(queue)
-        
+
+        # A node can sit in the heap several times; only its first pop counts
+        if current in closed:
+            stats.stale_pops += 1
+            continue
+
         if current == goal:
+            stats.status = SearchStats.FOUND
             break
-        
-        for next_node in graph[current]:
-            new_cost = cost_so_far[current] + graph[current][next_node]
+
+        if max_expansions is not None and stats.nodes_expanded >= max_expansions or \
+                deadline is not None and time.perf_counter() > deadline:
+            stats.status = SearchStats.BUDGET_EXCEEDED
+            break
+
+        closed.add(current)
+        stats.nodes_expanded += 1
+        for next_node, distance in graph.get(current, {}).items():
+            if next_node in closed:
+                continue
+            new_cost = cost_so_far[current] + distance
             if next_node not in cost_so_far or new_cost < cost_so_far[next_node]:
                 cost_so_far[next_node] = new_cost
                 priority = new_cost + heuristic(next_node, goal)
                 heapq.heappush(queue, (priority, next_node))
+                stats.heap_pushes += 1
                 came_from[next_node] = current
-    
+
+    stats.elapsed = time.perf_counter() - started
+    if stats.status != SearchStats.FOUND:
+        return None
+    stats.cost = cost_so_far[goal]
+
     # Reconstruct path
     path = []
     current = goal
@@ -84,24 +139,155 @@ def a_star_search(graph, start, goal):
     return path
 
 
+# Dijkstra from a single source, returning the distance and the next node back towards the source
+def dijkstra(graph, source):
+    dist = {source: 0}
+    towards_source = {source: None}
+    closed = set()
+    queue = [(0, source)]
+    while queue:
+        cost, current = heapq.heappop(queue)
+        if current in closed:
+            continue
+        closed.add(current)
+        for next_node, distance in graph.get(current, {}).items():
+            new_cost = cost + distance
+            if next_node not in closed and new_cost < dist.get(next_node, math.inf):
+                dist[next_node] = new_cost
+                towards_source[next_node] = current
+                heapq.heappush(queue, (new_cost, next_node))
+    return dist, towards_source
+
+
+# Function to build the waypoint-to-waypoint graph, which is static for a floor
+def build_waypoint_graph(waypoints, walls):
+    graph = {node: {} for node in waypoints}
+    if len(waypoints) < 2:
+        return graph
+
+    # Test every waypoint pair against every wall in one batched pass
+    points = np.asarray(waypoints, dtype=np.float64)
+    rows, cols = np.triu_indices(len(waypoints), k=1)
+    segments = np.stack((points[rows], points[cols]), axis=1)
+    clear = segments_clear(segments, walls)
+
+    for i, j in zip(rows[clear].tolist(), cols[clear].tolist()):
+        node_a, node_b = waypoints[i], waypoints[j]
+        distance = heuristic(node_a, node_b)
+        graph[node_a][node_b] = distance
+        graph[node_b][node_a] = distance
+    return graph
+
+
+# Function to get the cached wall index of a floor, for single-segment line_is_clear
+# checks (route cache, navigation sessions). Graph building uses the batched
+# segments_clear on the wall array instead; one segment is ~10x faster through the index
+def get_wall_index(floor_map):
+    return floor_map.cached("wall_index", lambda: WallGrid(floor_map.walls))
+
+
+# Function to get the cached wall array of a floor, used by the batched visibility tests
+def get_wall_array(floor_map):
+    return floor_map.cached("wall_array", lambda: as_segment_array(floor_map.walls))
+
+
+# Function to get the cached waypoint graph of a floor
+def get_waypoint_graph(floor_map):
+    return floor_map.cached(
+        "waypoint_graph",
+        lambda: build_waypoint_graph(floor_map.waypoints, get_wall_array(floor_map)),
+    )
+
+
+# Function to get the route table of a floor, from its .routes.npz file if it is up to date
+def get_route_table(floor_map):
+    def load_or_build():
+        if floor_map.map_file is not None:
+            path = route_table_file(floor_map.map_file)
+            if os.path.exists(path):
+                table = RouteTable.load(path, floor_map)
+                if table is not None:
+                    return table
+        return RouteTable.build(get_waypoint_graph(floor_map), floor_map.destinations,
+                                get_wall_array(floor_map), floor_map.version)
+    return floor_map.cached("route_table", load_or_build)
+
+
+# Function to connect extra points (start, end, connectors, ...) to a waypoint graph
+def attach_points(graph, walls, points):
+    """
+    Returns a query graph with every point connected to every visible node and to each other.
+
+    `graph` is not modified: the query graph shares its adjacency dicts and only
+    copies the ones that gain an edge, so each query costs O(N*W) instead of O(N^2*W).
+    """
+    query_graph = dict(graph)
+
+    def add_edge(node_a, node_b, distance):
+        for u, v in ((node_a, node_b), (node_b, node_a)):
+            neighbors = query_graph.setdefault(u, {})
+            if neighbors is graph.get(u):
+                neighbors = query_graph[u] = dict(neighbors)
+            neighbors[v] = distance
+
+    # One batch: each point -> every node, then every pair of points
+    nodes = list(graph)
+    pairs = [(a, b) for i, a in enumerate(points) for b in points[i + 1:] if a != b]
+    segments = np.empty((len(points) * len(nodes) + len(pairs), 2, 2))
+    for k, point in enumerate(points):
+        segments[k * len(nodes):(k + 1) * len(nodes), 0] = point
+        if nodes:
+            segments[k * len(nodes):(k + 1) * len(nodes), 1] = nodes
+    if pairs:
+        segments[len(points) * len(nodes):] = pairs
+    clear = segments_clear(segments, walls).tolist()
+
+    for k, point in enumerate(points):
+        query_graph.setdefault(point, {})
+        offset = k * len(nodes)
+        for node, visible in zip(nodes, clear[offset:offset + len(nodes)]):
+            if visible:
+                add_edge(point, node, heuristic(point, node))
+    for (point_a, point_b), visible in zip(pairs, clear[len(points) * len(nodes):]):
+        if visible:
+            add_edge(point_a, point_b, heuristic(point_a, point_b))
+    return query_graph
+
+
+# Function to connect the start and end points to a waypoint graph
+def attach_endpoints(graph, walls, start_point, end_point):
+    return attach_points(graph, walls, [start_point, end_point])
+
+
 # Function to build the graph
 def build_graph(waypoints, walls, start_point, end_point):
-    nodes = waypoints.copy()
-    nodes.extend([start_point, end_point])
-    graph = {node: {} for node in nodes}
-    
-    for i, node_a in enumerate(nodes):
-        for node_b in nodes[i+1:]:
-            if line_is_clear(node_a, node_b, walls):
-                distance = heuristic(node_a, node_b)
-                graph[node_a][node_b] = distance
-                graph[node_b][node_a] = distance
-    return graph
+    return attach_endpoints(build_waypoint_graph(waypoints, walls), walls, start_point, end_point)
 
 
 # Main function to find the path
-def find_optimal_path(floor_name, start_pose, end_point):
-    walls, waypoints, destinations = load_map_data(floor_name)
+def find_optimal_path(floor_name, start_pose, end_point, store=None, use_route_table=False,
+                      max_expansions=None, time_budget=None, stats=None, backend="waypoints",
+                      grid_resolution=GRID_RESOLUTION, clearance=GRID_CLEARANCE):
+    """
+    Finds the path from the user's pose to a destination name or (x, y) point.
+
+    backend="waypoints" searches the visibility graph of the hand-placed waypoints.
+    backend="grid" plans on an occupancy grid of the walls instead (cells of
+    `grid_resolution` map units, walls inflated by `clearance`), so it does not
+    depend on the waypoints at all.
+    """
+    floor_map = (store or map_store).get(floor_name)
+    if floor_map is None:
+        raise ValueError(f"No map data found for floor {floor_name}.")
+    destinations = floor_map.destinations
+
+    # Routes to named destinations can be read from the precomputed route table
+    if use_route_table and isinstance(end_point, str) and end_point in destinations:
+        start_point = (start_pose[0], start_pose[1])
+        path = get_route_table(floor_map).route(start_point, end_point, get_wall_array(floor_map))
+        if path is None:
+            print("No path found: The destination is not reachable from the start point.")
+        return path
     
     # If the end point is a destination name, get its coordinates
     if isinstance(end_point, str) and end_point in destinations:
@@ -112,16 +298,120 @@ def find_optimal_path(floor_name, start_pose, end_point):
         raise ValueError("End point must be a tuple of coordinates or a valid destination name.")
     
     start_point = (start_pose[0], start_pose[1])
+
+    if backend == "grid":
+        grid = get_occupancy_grid(floor_map, grid_resolution, clearance)
+        path = grid_path(grid, start_point, end_point, stats)
+        if path is None:
+            print("No path found: The destination is not reachable from the start point.")
+        return path
+    elif backend != "waypoints":
+        raise ValueError(f"Unknown pathfinding backend {backend}.")
     
-    # Build the graph
-    graph = build_graph(waypoints, walls, start_point, end_point)
+    # Connect the start and end points to the cached waypoint graph
+    graph = attach_endpoints(get_waypoint_graph(floor_map), get_wall_array(floor_map), start_point, end_point)
     
     # Check if start and end points are connected to the graph
-    if start_point not in graph or end_point not in graph:
+    if start_point != end_point and (not graph[start_point] or not graph[end_point]):
         print("No path found: Start or end point is not connected to the graph.")
+        if stats is not None:
+            stats.status = SearchStats.UNREACHABLE
         return None
     
     # Find the path using A*
-    path = a_star_search(graph, start_point, end_point)
+    if stats is None:
+        stats = SearchStats()
+    path = a_star_search(graph, start_point, end_point, max_expansions, time_budget, stats)
+    if path is None:
+        if stats.status == SearchStats.BUDGET_EXCEEDED:
+            print("No path found: Search budget exceeded.")
+        else:
+            print("No path found: The destination is not reachable from the start point.")
     
-    return path
\ No newline at end of file
+    return path
+
+
+# Function to route many users to the same destination with a single search
+def find_optimal_paths_to(floor_name, destination, start_poses, store=None, scale=1.0):
+    """
+    Uses the destination's shortest-path tree (one Dijkstra per map version, see
+    get_goal_tree), then connects every start pose to it with a single batched
+    visibility test.
+
+    Args:
+        floor_name (str): Floor to route on.
+        destination (str): Destination name from destinations.json.
+        start_poses (list): (x, y, angle) poses of the users.
+        scale (float): Map units to meters, passed to generate_directions.
+
+    Returns:
+        list: (path, messages) for every start pose, or (None, None) if it cannot reach the destination.
+    """
+    floor_map = (store or map_store).get(floor_name)
+    if floor_map is None:
+        raise ValueError(f"No map data found for floor {floor_name}.")
+    if destination not in floor_map.destinations:
+        raise ValueError(f"Unknown destination {destination}.")
+    end_x, end_y, destination_angle = floor_map.destinations[destination][:3]
+    goal_tree = get_goal_tree(floor_map, (end_x, end_y))
+
+    results = []
+    starts = [pose[:2] for pose in start_poses]
+    for start_pose, first in zip(start_poses, connect_to_tree(goal_tree, get_wall_array(floor_map), starts)):
+        if first < 0:
+            results.append((None, None))
+            continue
+        path = trace_tree(goal_tree, (start_pose[0], start_pose[1]), first)
+        results.append((path, generate_directions(start_pose, path, destination_angle, scale)))
+    return results
+
+
+# Function to get the cached shortest-path tree of a floor towards an end point
+def get_goal_tree(floor_map, end_point):
+    """
+    Runs one Dijkstra from `end_point` over the cached waypoint graph. The graph is
+    undirected, so distances from the end point are distances to it.
+
+    Returns:
+        tuple: (nodes, node_points, node_cost, towards_goal) for the nodes that reach the
+        end point, with node_points an (N, 2) array and node_cost their distances.
+    """
+    def build():
+        graph = attach_points(get_waypoint_graph(floor_map), get_wall_array(floor_map), [end_point])
+        dist, towards_goal = dijkstra(graph, end_point)
+        nodes = [node for node in graph if node in dist]
+        node_cost = np.array([dist[node] for node in nodes])
+        node_points = np.asarray(nodes, dtype=np.float64).reshape(-1, 2)
+        return nodes, node_points, node_cost, towards_goal
+    return floor_map.cached(("goal_tree", tuple(end_point)), build)
+
+
+# Function to pick, for every start point, the tree node to walk to first
+def connect_to_tree(goal_tree, walls, starts):
+    """
+    Returns an array with, for each start, the index of the visible node with the
+    cheapest total route (first leg + distance to the goal), or -1 if no node is visible.
+    """
+    nodes, node_points, node_cost, _ = goal_tree
+    starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2)
+    if len(nodes) == 0:
+        return np.full(len(starts), -1)
+    segments = np.empty((len(starts), len(nodes), 2, 2))
+    segments[:, :, 0] = starts[:, None, :]
+    segments[:, :, 1] = node_points[None, :, :]
+    visible = segments_clear(segments.reshape(-1, 2, 2), walls).reshape(len(starts), len(nodes))
+    first_leg = np.hypot(node_points[None, :, 0] - starts[:, None, 0], node_points[None, :, 1] - starts[:, None, 1])
+    costs = np.where(visible, first_leg + node_cost[None, :], np.inf)
+    first = np.argmin(costs, axis=1)
+    return np.where(np.isfinite(costs[np.arange(len(starts)), first]), first, -1)
+
+
+# Function to follow the tree from a start point through its first node to the goal
+def trace_tree(goal_tree, start_point, first):
+    nodes, _, _, towards_goal = goal_tree
+    path = [start_point]
+    node = nodes[first]
+    while node is not None:
+        path.append(node)
+        node = towards_goal[node]
+    return path
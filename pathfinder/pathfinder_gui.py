@@ -7,7 +7,7 @@ import os
 import math
 from pathfinder import find_optimal_path
 from message import generate_directions
-import json
+from map_store import map_store
 
 class PathfinderGUI:
     def __init__(self, root):
@@ -74,28 +74,15 @@ class PathfinderGUI:
         # Store original dimensions
         self.original_width, self.original_height = self.image.shape[1], self.image.shape[0]
 
-        # Load map data (walls, waypoints)
-        json_file = os.path.join(self.data_path, "maps", self.floor_name + ".json")
-        if os.path.exists(json_file):
-            with open(json_file, "r") as f:
-                data = json.load(f)
-                self.walls = [(tuple(wall[0]), tuple(wall[1])) for wall in data.get("walls", [])]
-                self.waypoints = [tuple(waypoint) for waypoint in data.get("waypoints", [])]
-            print(f"Loaded map from {json_file}")
-        else:
+        # Load map data (walls, waypoints, destinations) through the shared map store
+        floor_map = map_store.get(self.floor_name)
+        if floor_map is None:
             print(f"No map file found for {self.floor_name}")
             return
-
-        # Load destinations from the global destinations.json file
-        dest_file = os.path.join(self.data_path, "destinations.json")
-        if os.path.exists(dest_file):
-            with open(dest_file, "r") as f:
-                all_destinations = json.load(f)
-            # Load destinations for the current floor only
-            self.destinations = {name: tuple(coords) for name, coords in all_destinations.get(self.floor_name, {}).items()}
-        else:
-            print(f"Destinations file not found.")
-            self.destinations = {}
+        self.walls = floor_map.walls
+        self.waypoints = floor_map.waypoints
+        self.destinations = floor_map.destinations
+        print(f"Loaded map from {map_store.map_file(self.floor_name)}")
 
         self.update_canvas()
 
@@ -198,13 +185,17 @@ class PathfinderGUI:
 
         start_pose = (self.start_pose[0], self.start_pose[1], self.start_pose[2])
         try:
-            self.path = find_optimal_path(self.floor_name, start_pose, self.selected_dest_point)
+            self.path = find_optimal_path(self.floor_name, start_pose, self.selected_dest_point, store=map_store)
         except Exception as e:
             messagebox.showwarning("Pathfinding Error", f"Error finding path: {e}")
             self.path = None
         
         self.update_canvas()
 
+        if self.path is None:
+            messagebox.showwarning("No Path", "The destination is not reachable from the start point.")
+            return
+
         messages = generate_directions(start_pose, self.path, self.selected_dest_angle, 0.025)
         formatted_message = "\n".join(messages)
         messagebox.showinfo("Path Found", formatted_message)
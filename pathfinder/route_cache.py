@@ -0,0 +1,165 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from map_store import map_store
+from message import generate_directions
+from pathfinder import find_optimal_path, get_wall_index, line_is_clear
+
+CELL_SIZE = 20.0        # map units per quantization cell of the start position
+MAX_ENTRIES = 4096
+TTL = 600.0             # seconds
+
+
+# Function to get the orientation announced at the end of a route
+def destination_heading(floor_map, destination, path, start_pose):
+    """
+    Named destinations use their angle from destinations.json, (x, y, angle) points their
+    own angle. Plain (x, y) points are announced straight ahead, along the last leg.
+    """
+    if isinstance(destination, str):
+        return floor_map.destinations[destination][2]
+    if len(destination) > 2:
+        return float(destination[2])
+    if len(path) > 1:
+        (x1, y1), (x2, y2) = path[-2], path[-1]
+        return math.degrees(math.atan2(y2 - y1, x2 - x1))
+    return start_pose[2]
+
+
+class RouteCache:
+    """
+    LRU/TTL cache of routes in front of find_optimal_path.
+
+    Entries are keyed by (floor, start cell, destination), where the start cell is the
+    start position quantized to `cell_size` map units, and hold the route without its
+    first point. On a hit only the first leg is redone for the exact start: it goes to
+    the second cached point if that is visible, otherwise to the first, and when neither
+    is visible the lookup counts as a miss. Entries of a floor are dropped as soon as
+    its map or destinations file changes.
+    """
+    def __init__(self, store=None, cell_size=CELL_SIZE, max_entries=MAX_ENTRIES, ttl=TTL):
+        self.store = store or map_store
+        self.cell_size = cell_size
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.versions = {}
+        self.hits = 0
+        self.misses = 0
+        self.blocked = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def key(self, floor_name, start_pose, destination, options=()):
+        cell = (math.floor(start_pose[0] / self.cell_size), math.floor(start_pose[1] / self.cell_size))
+        if not isinstance(destination, str):
+            destination = tuple(destination)
+        return floor_name, cell, destination, options
+
+    def _floor(self, floor_name):
+        floor_map = self.store.get(floor_name)
+        if floor_map is None:
+            raise ValueError(f"No map data found for floor {floor_name}.")
+        with self._lock:
+            if self.versions.get(floor_name) != floor_map.version:
+                # The map changed on disk: every route cached on the old version is stale
+                stale = [key for key in self.entries if key[0] == floor_name]
+                for key in stale:
+                    del self.entries[key]
+                self.invalidations += len(stale)
+                self.versions[floor_name] = floor_map.version
+        return floor_map
+
+    def lookup(self, floor_name, start_pose, destination, options=()):
+        """
+        Returns the cached route re-anchored at the exact start, or None on a miss.
+        `options` are the planner settings the route was found with (see find_path).
+        """
+        floor_map = self._floor(floor_name)
+        key = self.key(floor_name, start_pose, destination, options)
+        now = time.monotonic()
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and now - entry[1] > self.ttl:
+                del self.entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            rest = entry[0]
+
+        start_point = (start_pose[0], start_pose[1])
+        walls = floor_map.walls
+        index = get_wall_index(floor_map)
+        if len(rest) > 1 and line_is_clear(start_point, rest[1], walls, index):
+            path = [start_point] + rest[1:]
+        elif line_is_clear(start_point, rest[0], walls, index):
+            path = [start_point] + rest
+        else:
+            # Same cell, but the first waypoint is behind a wall from here
+            with self._lock:
+                self.blocked += 1
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def put(self, floor_name, start_pose, destination, path, options=()):
+        if path is None or len(path) < 2:
+            return
+        key = self.key(floor_name, start_pose, destination, options)
+        with self._lock:
+            self.entries[key] = (list(path[1:]), time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def find_path(self, floor_name, start_pose, destination, **kwargs):
+        """
+        Same as find_optimal_path, answered from the cache when possible. Extra keyword
+        arguments are passed to find_optimal_path on a miss and are part of the cache key
+        (except `stats`), so e.g. grid and waypoint routes are cached apart.
+        """
+        options = tuple(sorted((name, value) for name, value in kwargs.items() if name != "stats"))
+        path = self.lookup(floor_name, start_pose, destination, options)
+        if path is None:
+            end_point = destination if isinstance(destination, str) else tuple(destination[:2])
+            path = find_optimal_path(floor_name, start_pose, end_point, store=self.store, **kwargs)
+            self.put(floor_name, start_pose, destination, path, options)
+        return path
+
+    def route(self, floor_name, start_pose, destination, scale=1.0, **kwargs):
+        """
+        Returns (path, messages) for the exact start pose, or (None, None) if there is no path.
+        """
+        path = self.find_path(floor_name, start_pose, destination, **kwargs)
+        if path is None:
+            return None, None
+        floor_map = self.store.get(floor_name)
+        heading = destination_heading(floor_map, destination, path, start_pose)
+        return path, generate_directions(start_pose, path, heading, scale)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "blocked": self.blocked,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
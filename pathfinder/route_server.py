@@ -0,0 +1,230 @@
+import argparse
+import json
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from map_store import map_store
+from message import generate_directions
+from pathfinder import find_optimal_path, find_optimal_paths_to, get_wall_array, get_waypoint_graph
+from route_cache import CELL_SIZE, RouteCache, destination_heading
+
+DEFAULT_SCALE = 0.025       # map units to meters, as in the GUI
+MAX_BODY = 1 << 20          # largest accepted request body, in bytes
+
+
+# Function to route a batch of queries, sharing one search per (floor, destination)
+def route_batch(queries, store=None, scale=DEFAULT_SCALE, cache=None):
+    """
+    Args:
+        queries (list): {"floor", "start": [x, y, angle], "destination"} dicts, where the
+            destination is a name from destinations.json or an [x, y(, angle)] point.
+        scale (float): Map units to meters, passed to generate_directions.
+        cache (RouteCache): Answers repeated queries and keeps the new routes, if given.
+
+    Returns:
+        list: {"path", "messages"} (or {"error"}) for every query, in order.
+    """
+    store = store or map_store
+    results = [None] * len(queries)
+    named = defaultdict(list)
+
+    for i, query in enumerate(queries):
+        try:
+            floor_name = query["floor"]
+            start = tuple(float(v) for v in query["start"])
+            destination = query["destination"]
+            if len(start) != 3:
+                raise ValueError("Start must be [x, y, angle].")
+            if not isinstance(destination, str):
+                destination = [float(v) for v in destination]
+                if len(destination) not in (2, 3):
+                    raise ValueError("Destination must be a name, [x, y] or [x, y, angle].")
+        except (KeyError, TypeError, ValueError) as e:
+            results[i] = {"error": f"Bad query: {e}"}
+            continue
+        try:
+            if cache is not None:
+                path = cache.lookup(floor_name, start, destination)
+                if path is not None:
+                    results[i] = route_result(store.get(floor_name), start, destination, path, scale)
+                    continue
+            if isinstance(destination, str):
+                # Users heading to the same destination share a single reverse search
+                named[(floor_name, destination)].append((i, start))
+                continue
+            results[i] = route_to_point(floor_name, start, destination, store, scale, cache)
+        except (KeyError, TypeError, ValueError) as e:
+            results[i] = {"error": str(e)}
+
+    for (floor_name, destination), group in named.items():
+        try:
+            routes = find_optimal_paths_to(floor_name, destination, [start for _, start in group], store, scale)
+        except ValueError as e:
+            for i, _ in group:
+                results[i] = {"error": str(e)}
+            continue
+        for (i, start), (path, messages) in zip(group, routes):
+            if path is None:
+                results[i] = {"error": "No path found."}
+                continue
+            results[i] = {"path": [list(point) for point in path], "messages": messages}
+            if cache is not None:
+                cache.put(floor_name, start, destination, path)
+    return results
+
+
+# Function to route one query to an [x, y(, angle)] point
+def route_to_point(floor_name, start, destination, store, scale, cache=None):
+    end_point = (float(destination[0]), float(destination[1]))
+    path = find_optimal_path(floor_name, start, end_point, store=store)
+    if path is None:
+        return {"error": "No path found."}
+    if cache is not None:
+        cache.put(floor_name, start, destination, path)
+    return route_result(store.get(floor_name), start, destination, path, scale)
+
+
+def route_result(floor_map, start, destination, path, scale):
+    heading = destination_heading(floor_map, destination, path, start)
+    return {"path": [list(point) for point in path],
+            "messages": generate_directions(start, path, heading, scale)}
+
+
+class RouteHandler(BaseHTTPRequestHandler):
+    """
+    POST /routes with {"queries": [...], "scale"} returns {"routes": [...], "elapsed_ms"}.
+    GET /health returns the loaded floors, request counters and route cache statistics.
+
+    Every response carries a Content-Length, so HTTP/1.1 clients keep the connection open
+    across requests.
+    """
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, a kept-alive connection
+    # waits for the delayed ACK before the body is sent
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, self.server.status())
+        else:
+            self._send(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/routes":
+            self._send(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length"))
+        except (TypeError, ValueError):
+            length = -1
+        if length < 0:
+            # Without a valid length the rest of the stream cannot be framed
+            self.close_connection = True
+            self._send(400, {"error": "Bad request: missing or invalid Content-Length."})
+            return
+        if length > MAX_BODY:
+            self.close_connection = True
+            self._send(413, {"error": "Request body too large."})
+            return
+        try:
+            body = json.loads(self.rfile.read(length))
+            queries = body["queries"] if isinstance(body, dict) else body
+            scale = float(body.get("scale", self.server.scale)) if isinstance(body, dict) else self.server.scale
+            if not isinstance(queries, list):
+                raise ValueError("queries must be a list")
+        except (ValueError, KeyError, TypeError) as e:
+            self._send(400, {"error": f"Bad request: {e}"})
+            return
+
+        start = time.perf_counter()
+        routes = route_batch(queries, self.server.store, scale, self.server.cache)
+        elapsed = (time.perf_counter() - start) * 1e3
+        self.server.count(len(queries), elapsed)
+        self._send(200, {"routes": routes, "elapsed_ms": elapsed})
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class RouteServer(ThreadingHTTPServer):
+    """
+    Thread-per-connection HTTP server sharing one MapStore, so each floor's map, wall
+    array and waypoint graph are loaded once and reused by every request.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, store=None, scale=DEFAULT_SCALE, verbose=False, cache=None):
+        super().__init__(address, RouteHandler)
+        self.store = store or map_store
+        self.cache = cache
+        self.scale = scale
+        self.verbose = verbose
+        self.requests = 0
+        self.queries = 0
+        self.busy_ms = 0.0
+        self._lock = threading.Lock()
+
+    def preload(self, floor_names):
+        """
+        Loads the floors and builds their cached structures before the first request.
+        """
+        for floor_name in floor_names:
+            floor_map = self.store.get(floor_name)
+            if floor_map is None:
+                continue
+            get_wall_array(floor_map)
+            get_waypoint_graph(floor_map)
+            print(f"Preloaded {floor_name}: {len(floor_map.waypoints)} waypoints, {len(floor_map.walls)} walls")
+
+    def count(self, queries, elapsed_ms):
+        with self._lock:
+            self.requests += 1
+            self.queries += queries
+            self.busy_ms += elapsed_ms
+
+    def status(self):
+        with self._lock:
+            return {
+                "floors": {name: list(floor_map.version) for name, floor_map in self.store.loaded().items()},
+                "requests": self.requests,
+                "queries": self.queries,
+                "mean_ms": self.busy_ms / self.requests if self.requests else None,
+                "cache": self.cache.stats() if self.cache is not None else None,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP route server for batches of route queries")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--preload", nargs="*", default=["basic-floor-plan"], help="Floors to load at startup")
+    parser.add_argument("--scale", type=float, default=DEFAULT_SCALE, help="Map units to meters")
+    parser.add_argument("--cache-cell", type=float, default=CELL_SIZE,
+                        help="Route cache cell size in map units (0 disables the cache)")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    cache = RouteCache(cell_size=args.cache_cell) if args.cache_cell > 0 else None
+    server = RouteServer((args.host, args.port), scale=args.scale, verbose=args.verbose, cache=cache)
+    server.preload(args.preload)
+    print(f"Route server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
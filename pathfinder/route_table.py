@@ -0,0 +1,168 @@
+import math
+import os
+import numpy as np
+from visibility import points_clear
+
+
+class RouteTable:
+    """
+    All-pairs shortest paths between the waypoints of a floor, plus the cost of
+    reaching every destination from every waypoint.
+
+    Destinations are only reachable as the last stop, the same way find_optimal_path
+    treats its end point, so routes never pass through another destination.
+    A query only has to find the waypoints visible from the user and read the tables.
+    """
+    def __init__(self, waypoints, dist, next_hop, dest_names, dest_points, dest_dist, dest_last, version):
+        self.waypoints = waypoints          # list of (x, y) tuples, index order of the matrices
+        self.dist = dist                    # (N, N) waypoint-to-waypoint path cost
+        self.next_hop = next_hop            # (N, N) next waypoint index on the path, -1 if unreachable
+        self.dest_names = dest_names
+        self.dest_points = dest_points      # list of (x, y) tuples
+        self.dest_dist = dest_dist          # (N, G) cost from waypoint to destination
+        self.dest_last = dest_last          # (N, G) last waypoint before the destination, -1 if unreachable
+        self.version = version
+        self.points = np.asarray(waypoints, dtype=np.float64).reshape(-1, 2)
+        self.dest_index = {name: g for g, name in enumerate(dest_names)}
+
+    @classmethod
+    def build(cls, graph, destinations, walls, version):
+        """
+        Runs Floyd-Warshall over the waypoint graph and connects every destination to it.
+
+        Args:
+            graph (dict): Waypoint visibility graph, {node: {neighbor: distance}}.
+            destinations (dict): {name: (x, y, angle)} for the floor.
+            walls: Wall segments (list or (W, 2, 2) array).
+            version: Map version the table is built from.
+        """
+        waypoints = list(graph)
+        index = {node: i for i, node in enumerate(waypoints)}
+        n = len(waypoints)
+
+        dist = np.full((n, n), np.inf)
+        next_hop = np.full((n, n), -1, dtype=np.int32)
+        for node, neighbors in graph.items():
+            i = index[node]
+            for neighbor, distance in neighbors.items():
+                j = index[neighbor]
+                dist[i, j] = distance
+                next_hop[i, j] = j
+        np.fill_diagonal(dist, 0.0)
+        np.fill_diagonal(next_hop, np.arange(n, dtype=np.int32))
+
+        for k in range(n):
+            through_k = dist[:, k, None] + dist[None, k, :]
+            better = through_k < dist
+            dist = np.where(better, through_k, dist)
+            next_hop = np.where(better, next_hop[:, k, None], next_hop)
+
+        dest_names = sorted(destinations)
+        dest_points = [tuple(destinations[name][:2]) for name in dest_names]
+        dest_dist = np.full((n, len(dest_names)), np.inf)
+        dest_last = np.full((n, len(dest_names)), -1, dtype=np.int32)
+        points = np.asarray(waypoints, dtype=np.float64).reshape(-1, 2)
+        for g, dest_point in enumerate(dest_points):
+            if n == 0:
+                break
+            visible = points_clear(dest_point, points, walls)
+            last_leg = np.where(visible, np.hypot(points[:, 0] - dest_point[0], points[:, 1] - dest_point[1]), np.inf)
+            total = dist + last_leg[None, :]
+            last = np.argmin(total, axis=1)
+            dest_dist[:, g] = total[np.arange(n), last]
+            dest_last[:, g] = np.where(np.isfinite(dest_dist[:, g]), last, -1)
+
+        return cls(waypoints, dist, next_hop, dest_names, dest_points, dest_dist, dest_last, version)
+
+    def save(self, path):
+        np.savez(
+            path,
+            waypoints=self.points,
+            dist=self.dist,
+            next_hop=self.next_hop,
+            dest_names=np.array(self.dest_names, dtype=str),
+            dest_points=np.asarray(self.dest_points, dtype=np.float64).reshape(-1, 2),
+            dest_dist=self.dest_dist,
+            dest_last=self.dest_last,
+            version=np.array(self.version, dtype=np.int64),
+        )
+
+    @classmethod
+    def load(cls, path, floor_map):
+        """
+        Loads a table saved by `save`. Returns None if it was built from another version of the map.
+        """
+        with np.load(path) as data:
+            if tuple(data["version"].tolist()) != tuple(floor_map.version):
+                return None
+            dest_names = data["dest_names"].tolist()
+            dest_points = [tuple(floor_map.destinations[name][:2]) for name in dest_names]
+            waypoints = list(dict.fromkeys(floor_map.waypoints))
+            return cls(waypoints, data["dist"], data["next_hop"], dest_names, dest_points,
+                       data["dest_dist"], data["dest_last"], floor_map.version)
+
+    def waypoint_path(self, i, j):
+        """
+        Returns the waypoint indices from i to j, inclusive.
+        """
+        path = [i]
+        while i != j:
+            i = int(self.next_hop[i, j])
+            path.append(i)
+        return path
+
+    def route(self, start_point, destination, walls):
+        """
+        Returns the shortest path from `start_point` to the named destination, or None if there is none.
+        """
+        g = self.dest_index[destination]
+        dest_point = self.dest_points[g]
+
+        # One batch: start -> every waypoint, then start -> destination
+        targets = np.empty((len(self.points) + 1, 2))
+        targets[:-1] = self.points
+        targets[-1] = dest_point
+        visible = points_clear(start_point, targets, walls)
+
+        first_leg = np.hypot(targets[:, 0] - start_point[0], targets[:, 1] - start_point[1])
+        costs = np.where(visible[:-1], first_leg[:-1] + self.dest_dist[:, g], np.inf)
+        best_first = int(np.argmin(costs)) if len(costs) else None
+        best_cost = costs[best_first] if best_first is not None else math.inf
+
+        if visible[-1] and first_leg[-1] <= best_cost:
+            return [start_point, dest_point]
+        if not np.isfinite(best_cost):
+            return None
+
+        last = int(self.dest_last[best_first, g])
+        path = [start_point]
+        path.extend(self.waypoints[i] for i in self.waypoint_path(best_first, last))
+        path.append(dest_point)
+        return path
+
+
+def route_table_file(map_file):
+    return os.path.splitext(map_file)[0] + ".routes.npz"
+
+
+def main():
+    import argparse
+    from map_store import map_store
+    from pathfinder import get_wall_array, get_waypoint_graph
+
+    parser = argparse.ArgumentParser(description="Precompute the route table of a floor")
+    parser.add_argument("floor", help="Floor name, e.g. basic-floor-plan")
+    args = parser.parse_args()
+
+    floor_map = map_store.get(args.floor)
+    if floor_map is None:
+        return
+    table = RouteTable.build(get_waypoint_graph(floor_map), floor_map.destinations,
+                             get_wall_array(floor_map), floor_map.version)
+    path = route_table_file(floor_map.map_file)
+    table.save(path)
+    print(f"Saved route table to {path}")
+
+
+if __name__ == "__main__":
+    main()
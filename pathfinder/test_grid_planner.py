@@ -0,0 +1,36 @@
+import random
+from grid_planner import OccupancyGrid, grid_path
+from map_store import map_store
+from pathfinder import SearchStats, find_optimal_path, line_is_clear
+
+
+def test_snap_stays_on_the_same_side_of_a_wall():
+    walls = [((0.0, 50.0), (100.0, 50.0))]
+    grid = OccupancyGrid(walls, resolution=5.0, clearance=10.0)
+    for y in (46.0, 49.0, 51.0, 54.0):
+        cell = grid.nearest_free(grid.to_cell((50.0, y)), (50.0, y))
+        assert (grid.to_point(cell)[1] < 50.0) == (y < 50.0)
+
+
+def test_grid_path_end_legs_never_cross_a_wall():
+    floor_map = map_store.get("basic-floor-plan")
+    rng = random.Random(0)
+    destinations = sorted(floor_map.destinations)
+    starts = [(216.6, 194.4, 0.0)]
+    for _ in range(100):
+        x, y = rng.choice(floor_map.waypoints)[:2]
+        starts.append((x + rng.uniform(-30, 30), y + rng.uniform(-30, 30), 0.0))
+    for start in starts:
+        path = find_optimal_path(floor_map.floor_name, start, rng.choice(destinations), backend="grid")
+        if path is not None:
+            assert all(line_is_clear(a, b, floor_map.walls) for a, b in zip(path, path[1:]))
+
+
+def test_blocked_end_leg_is_unreachable():
+    # A closed box: the start outside cannot reach the goal inside
+    walls = [((0.0, 0.0), (100.0, 0.0)), ((100.0, 0.0), (100.0, 100.0)),
+             ((100.0, 100.0), (0.0, 100.0)), ((0.0, 100.0), (0.0, 0.0))]
+    grid = OccupancyGrid(walls, resolution=5.0, clearance=10.0, points=[(-40.0, 50.0)])
+    stats = SearchStats()
+    assert grid_path(grid, (-30.0, 50.0), (50.0, 50.0), stats) is None
+    assert stats.status == "unreachable"
@@ -0,0 +1,40 @@
+import http.client
+import json
+import threading
+import pytest
+from route_server import RouteServer
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = RouteServer(("127.0.0.1", 0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post(server, body, headers=None):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=5)
+    connection.request("POST", "/routes", body, headers or {"Content-Type": "application/json"})
+    response = connection.getresponse()
+    payload = json.loads(response.read())
+    connection.close()
+    return response.status, payload
+
+
+def test_bad_destination_points_get_a_per_query_error(server):
+    queries = [{"floor": "basic-floor-plan", "start": [130, 350, 0], "destination": destination}
+               for destination in ([1], [1, 2, 3, 4], ["a", 2], 5)]
+    queries.append({"floor": "basic-floor-plan", "start": [130, 350, 0], "destination": [300, 300]})
+    status, payload = post(server, json.dumps({"queries": queries}))
+    assert status == 200
+    routes = payload["routes"]
+    assert all("error" in route for route in routes[:-1])
+    assert "path" in routes[-1]
+
+
+def test_invalid_content_length_is_a_bad_request(server):
+    status, payload = post(server, b"[]", {"Content-Length": "abc"})
+    assert status == 400
@@ -0,0 +1,75 @@
+import numpy as np
+
+# Upper bound on segment/wall pairs tested at once, to keep the temporaries small
+CHUNK_PAIRS = 1 << 18
+
+
+def as_segment_array(segments):
+    """
+    Converts a list of ((x1, y1), (x2, y2)) segments into a float (N, 2, 2) array.
+    Arrays are returned unchanged.
+    """
+    if isinstance(segments, np.ndarray):
+        return segments
+    return np.asarray(segments, dtype=np.float64).reshape(-1, 2, 2)
+
+
+def _ccw(a, b, c):
+    # Same expression as lines_intersect.ccw, so the results match the scalar path
+    return (c[..., 1] - a[..., 1]) * (b[..., 0] - a[..., 0]) > (b[..., 1] - a[..., 1]) * (c[..., 0] - a[..., 0])
+
+
+def segments_clear(segments, walls, chunk_pairs=CHUNK_PAIRS):
+    """
+    Batched version of line_is_clear.
+
+    Args:
+        segments: (M, 2, 2) array (or list) of query segments.
+        walls: (W, 2, 2) array (or list) of wall segments.
+        chunk_pairs (int): Maximum number of segment/wall pairs tested in one NumPy pass.
+
+    Returns:
+        numpy array: (M,) bool mask, True where the segment crosses no wall.
+    """
+    segments = as_segment_array(segments)
+    walls = as_segment_array(walls)
+    clear = np.ones(len(segments), dtype=bool)
+    if len(segments) == 0 or len(walls) == 0:
+        return clear
+
+    # Bounding boxes reject most pairs with a few comparisons; the exact ccw test
+    # only runs on the pairs whose (slightly padded) boxes overlap
+    wall_low = walls.min(axis=1)
+    wall_high = walls.max(axis=1)
+    eps = 1e-9 * max(1.0, float(np.abs(walls).max()))
+    wall_low -= eps
+    wall_high += eps
+
+    rows = max(1, chunk_pairs // len(walls))
+    for start in range(0, len(segments), rows):
+        block = segments[start:start + rows]
+        low = block.min(axis=1)
+        high = block.max(axis=1)
+        overlap = (low[:, None, 0] <= wall_high[None, :, 0]) & (high[:, None, 0] >= wall_low[None, :, 0]) & \
+                  (low[:, None, 1] <= wall_high[None, :, 1]) & (high[:, None, 1] >= wall_low[None, :, 1])
+        seg_idx, wall_idx = np.nonzero(overlap)
+        if len(seg_idx) == 0:
+            continue
+        p1 = block[seg_idx, 0]
+        p2 = block[seg_idx, 1]
+        q1 = walls[wall_idx, 0]
+        q2 = walls[wall_idx, 1]
+        hits = (_ccw(p1, q1, q2) != _ccw(p2, q1, q2)) & (_ccw(p1, p2, q1) != _ccw(p1, p2, q2))
+        clear[start + seg_idx[hits]] = False
+    return clear
+
+
+def points_clear(point, targets, walls, chunk_pairs=CHUNK_PAIRS):
+    """
+    Returns a (N,) bool mask telling which of `targets` are visible from `point`.
+    """
+    targets = np.asarray(targets, dtype=np.float64).reshape(-1, 2)
+    segments = np.empty((len(targets), 2, 2))
+    segments[:, 0, :] = point
+    segments[:, 1, :] = targets
+    return segments_clear(segments, walls, chunk_pairs)
@@ -0,0 +1,75 @@
+import math
+from collections import defaultdict
+
+
+class WallGrid:
+    """
+    Uniform grid over wall segments.
+
+    Each wall is registered in every cell its bounding box touches. A segment
+    query only returns the walls registered in the cells the segment crosses,
+    so the exact intersection test runs on a handful of walls instead of all of them.
+    Both sides are padded by a small epsilon, which keeps the result identical
+    to testing every wall.
+
+    Used for one segment at a time (line_is_clear). Many segments at once, as when
+    building the waypoint graph, go through visibility.segments_clear instead.
+    """
+    def __init__(self, walls, cell_size=None):
+        self.walls = list(walls)
+        if cell_size is None:
+            cell_size = self._default_cell_size(self.walls)
+        self.cell_size = float(cell_size)
+        self.eps = 1e-6 * self.cell_size
+        self.cells = defaultdict(list)
+
+        for i, ((x1, y1), (x2, y2)) in enumerate(self.walls):
+            for cx in range(self._cell(min(x1, x2) - self.eps), self._cell(max(x1, x2) + self.eps) + 1):
+                for cy in range(self._cell(min(y1, y2) - self.eps), self._cell(max(y1, y2) + self.eps) + 1):
+                    self.cells[(cx, cy)].append(i)
+        self.cells = dict(self.cells)
+
+    @staticmethod
+    def _default_cell_size(walls):
+        # Average wall length keeps most walls in a few cells
+        if not walls:
+            return 1.0
+        total = sum(math.hypot(q[0] - p[0], q[1] - p[1]) for p, q in walls)
+        return max(total / len(walls), 1.0)
+
+    def _cell(self, value):
+        return math.floor(value / self.cell_size)
+
+    def segment_cells(self, point1, point2):
+        """
+        Yields every grid cell the segment from point1 to point2 passes through (or grazes).
+        """
+        (x1, y1), (x2, y2) = point1, point2
+        if x1 > x2:
+            x1, y1, x2, y2 = x2, y2, x1, y1
+        dx = x2 - x1
+        cs = self.cell_size
+        for cx in range(self._cell(x1 - self.eps), self._cell(x2 + self.eps) + 1):
+            # Part of the segment inside this column
+            xa = min(max(x1, cx * cs), x2)
+            xb = max(min(x2, (cx + 1) * cs), x1)
+            if dx == 0:
+                ya, yb = y1, y2
+            else:
+                ya = y1 + (xa - x1) * (y2 - y1) / dx
+                yb = y1 + (xb - x1) * (y2 - y1) / dx
+            for cy in range(self._cell(min(ya, yb) - self.eps), self._cell(max(ya, yb) + self.eps) + 1):
+                yield (cx, cy)
+
+    def candidates(self, point1, point2):
+        """
+        Returns the walls that may intersect the segment from point1 to point2.
+        """
+        cells = self.cells
+        found = set()
+        for cell in self.segment_cells(point1, point2):
+            ids = cells.get(cell)
+            if ids:
+                found.update(ids)
+        walls = self.walls
+        return [walls[i] for i in found]
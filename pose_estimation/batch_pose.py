@@ -0,0 +1,157 @@
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+from src import pose_estimator
+from benchmark_detection import iphone_camera_matrix
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+FIELDS = ["image", "width", "height", "tag_ids", "x", "y", "yaw", "reprojection_error",
+          "decode_ms", "detect_ms", "pose_ms", "error"]
+STAGES = ["decode_ms", "detect_ms", "pose_ms"]
+
+# Glasses camera intrinsics, for frames saved at 320 x 240
+GLASSES_CAMERA_MATRIX = [[657, 0, 312.18],
+                         [0, 657.26, 241.739],
+                         [0, 0, 1]]
+
+# Per-worker state, set up once by init_worker
+_estimator = None
+_options = None
+
+
+# Function to create the pose estimator (and its detector) of one worker process
+def init_worker(json_path, options):
+    global _estimator, _options
+    _options = options
+    camera_matrix = GLASSES_CAMERA_MATRIX if options["camera"] == "glasses" else np.eye(3)
+    _estimator = pose_estimator.PoseEstimator.from_json(
+        json_path, camera_matrix, np.zeros((1, 5)), options["tag_size"],
+        fused=options["fused"], decimate=options["decimate"], refine=options["refine"],
+        pnp_method=options["pnp_method"])
+
+
+# Function to estimate the camera pose of one image in a worker
+def process_image(path):
+    row = {"image": path}
+    start = time.perf_counter()
+    gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        row["error"] = "unreadable image"
+        return row
+    if _options["resize"] != 1:
+        gray = cv2.resize(gray, None, fx=_options["resize"], fy=_options["resize"], interpolation=cv2.INTER_AREA)
+    height, width = gray.shape
+    row["width"], row["height"] = width, height
+    if _options["camera"] == "iphone":
+        _estimator.camera_matrix = iphone_camera_matrix(width, height)
+    decoded = time.perf_counter()
+
+    detected_info = _estimator.detect(gray)
+    detected = time.perf_counter()
+    pose = _estimator.estimate(detected_info)
+    solved = time.perf_counter()
+
+    row["decode_ms"] = (decoded - start) * 1e3
+    row["detect_ms"] = (detected - decoded) * 1e3
+    row["pose_ms"] = (solved - detected) * 1e3
+    row["tag_ids"] = ";".join(str(tag["id"]) for tag in detected_info)
+    if pose is None:
+        row["error"] = "no tag detected" if not detected_info else "no pose found"
+        return row
+    row["x"], row["y"], row["yaw"] = pose["x"], pose["y"], pose["yaw"]
+    row["reprojection_error"] = pose.get("reprojection_error")
+    return row
+
+
+# Function to list the images under a directory, in a stable order
+def find_images(directory):
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(paths)
+
+
+class ResultWriter:
+    """
+    Streams result rows to a CSV or JSONL file as they arrive.
+    """
+    def __init__(self, path, fmt=None):
+        self.fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".json")) else "csv")
+        self.file = open(path, "w", newline="")
+        self.writer = None
+        if self.fmt == "csv":
+            self.writer = csv.DictWriter(self.file, fieldnames=FIELDS)
+            self.writer.writeheader()
+
+    def write(self, row):
+        if self.writer is not None:
+            self.writer.writerow(row)
+        else:
+            self.file.write(json.dumps(row) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate the camera pose of every image in a directory")
+    parser.add_argument("directory", nargs="?", default=os.path.join(script_dir, "images"))
+    parser.add_argument("-o", "--output", default="poses.csv", help="Output .csv or .jsonl file")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Output format (default: from the file name)")
+    parser.add_argument("--json", default=os.path.join(script_dir, "apriltags.json"), help="Tag map")
+    parser.add_argument("--camera", choices=["iphone", "glasses"], default="iphone")
+    parser.add_argument("--resize", type=float, default=1.0,
+                        help="Scale applied to the images before detection (the samples are stored at 1330x997)")
+    parser.add_argument("--tag-size", type=float, default=0.1)
+    parser.add_argument("--decimate", type=float, default=1)
+    parser.add_argument("--refine", action="store_true", help="Sub-pixel corner refinement")
+    parser.add_argument("--single-tag", action="store_true", help="Use the first tag only instead of all visible tags")
+    parser.add_argument("--pnp-method", default="iterative")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunksize", type=int, default=4)
+    args = parser.parse_args()
+
+    paths = find_images(args.directory)
+    if not paths:
+        print(f"No images found in {args.directory}")
+        return
+    options = {
+        "camera": args.camera,
+        "resize": args.resize,
+        "tag_size": args.tag_size,
+        "decimate": args.decimate,
+        "refine": args.refine,
+        "fused": not args.single_tag,
+        "pnp_method": args.pnp_method,
+    }
+
+    writer = ResultWriter(args.output, args.format)
+    totals = dict.fromkeys(STAGES, 0.0)
+    posed = 0
+    started = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                 initargs=(args.json, options)) as executor:
+            for row in executor.map(process_image, paths, chunksize=args.chunksize):
+                writer.write(row)
+                for stage in STAGES:
+                    totals[stage] += row.get(stage) or 0.0
+                posed += "x" in row
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - started
+
+    print(f"{len(paths)} images, {posed} poses, {args.workers} workers -> {args.output}")
+    for stage in STAGES:
+        print(f"  {stage[:-3]:<8} {totals[stage] / len(paths):8.2f} ms/image (per worker)")
+    print(f"  total    {elapsed:8.2f} s, {len(paths) / elapsed:.1f} frames/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import glob
+import json
+import os
+import time
+import apriltag
+import cv2
+import numpy as np
+from src import apriltag_detection_pnp, calculate_pose_pnp
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+real_tag_size = 0.1
+
+# (name, decimate, refine)
+MODES = [
+    ("full frame, int corners", 1, False),
+    ("full frame, sub-pixel", 1, True),
+    ("decimate 2, sub-pixel", 2, True),
+    ("decimate 4, sub-pixel", 4, True),
+]
+
+
+# Function to build the iPhone 12 Pro Max camera matrix used for the test images
+def iphone_camera_matrix(image_width, image_height):
+    camera_focal_length = 26 * image_width / 7.03
+    return np.array([[camera_focal_length, 0, round(image_width / 2)],
+                     [0, camera_focal_length, round(image_height / 2)],
+                     [0, 0, 1]], dtype=np.float64)
+
+
+def load_apriltag_dict():
+    with open(os.path.join(script_dir, "apriltags.json"), 'r') as f:
+        return {tag['id']: tag for tag in json.load(f)['apriltags']}
+
+
+# Function to load the sample images as grayscale (name, image) pairs
+def load_frames(images_dir, resize):
+    frames = []
+    for path in sorted(glob.glob(os.path.join(images_dir, "*.jpg"))):
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if resize != 1:
+            image = cv2.resize(image, None, fx=resize, fy=resize, interpolation=cv2.INTER_AREA)
+        frames.append((os.path.basename(path), image))
+    return frames
+
+
+# Function to get the RMS reprojection error (pixels) of the single-tag PnP pose
+def reprojection_error(corners, camera_matrix, dist_coeffs, method="iterative", guess=None):
+    rvec, tvec, success = calculate_pose_pnp.pnp(corners, camera_matrix, dist_coeffs, real_tag_size,
+                                                 method=method, guess=guess)
+    if not success:
+        return None
+    object_points = calculate_pose_pnp.tag_object_points(real_tag_size).astype(np.float64)
+    projected, _ = cv2.projectPoints(object_points, rvec, tvec, camera_matrix, dist_coeffs)
+    image_points = np.asarray([corners[i] for i in [3, 2, 1, 0]], dtype=np.float64)
+    return float(np.sqrt(np.mean(np.sum((projected.reshape(-1, 2) - image_points) ** 2, axis=1))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark decimated detection and sub-pixel corner refinement")
+    parser.add_argument("--images", default=os.path.join(script_dir, "images"))
+    parser.add_argument("--resize", type=float, default=1.0,
+                        help="Scale applied to the images before detection (the samples are stored at 1330x997)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    apriltag_dict = load_apriltag_dict()
+
+    frames = load_frames(args.images, args.resize)
+    if not frames:
+        print(f"No images found in {args.images}")
+        return
+    height, width = frames[0][1].shape
+    camera_matrix = iphone_camera_matrix(width, height)
+    dist_coeffs = np.zeros((1, 5))
+    print(f"{len(frames)} images, {width}x{height}, {args.repeat} runs each")
+
+    detector = apriltag.Detector()
+    print(f"  {'mode':<28} {'ms/frame':>9} {'tags':>5} {'reproj px':>10}")
+    for name, decimate, refine in MODES:
+        elapsed = 0.0
+        tags = 0
+        errors = []
+        for _, gray in frames:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                detected = apriltag_detection_pnp.detect_apriltags(gray, apriltag_dict, detector,
+                                                                   decimate=decimate, refine=refine)
+            elapsed += time.perf_counter() - start
+            tags += len(detected)
+            for tag in detected:
+                error = reprojection_error(tag["corners"], camera_matrix, dist_coeffs)
+                if error is not None:
+                    errors.append(error)
+        ms = elapsed / (args.repeat * len(frames)) * 1e3
+        mean_error = f"{np.mean(errors):10.3f}" if errors else f"{'-':>10}"
+        print(f"  {name:<28} {ms:9.2f} {tags:5d} {mean_error}")
+
+
+if __name__ == "__main__":
+    main()
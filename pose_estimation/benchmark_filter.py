@@ -0,0 +1,90 @@
+import argparse
+import json
+import math
+import time
+import numpy as np
+from src.pose_filter import PoseFilter, load_log, replay
+
+
+# Function to simulate walking a circle with a 200 Hz IMU and occasional tag fixes
+def simulate_log(seconds=60.0, imu_rate=200.0, fix_rate=2.0, radius=2.0, speed=1.0, seed=0):
+    """
+    Returns (events, truth): the log events in time order and {t: (x, y, yaw)} at every fix.
+    Every third second has no fixes, as when no tag is in view.
+    """
+    rng = np.random.default_rng(seed)
+    turn_rate = speed / radius      # rad/s
+    events = []
+    truth = {}
+    fix_every = int(round(imu_rate / fix_rate))
+    for i in range(int(seconds * imu_rate)):
+        t = i / imu_rate
+        angle = turn_rate * t
+        yaw = angle + math.pi / 2
+        # Walking a circle: no forward acceleration, centripetal acceleration to the right
+        events.append({"t": t, "type": "imu",
+                       "accel": [rng.normal(0, 0.3), speed * turn_rate + rng.normal(0, 0.3)],
+                       "yaw_rate": math.degrees(turn_rate) + rng.normal(0, 1.0)})
+        if i % fix_every == 0 and int(t) % 3 != 2:
+            x, y = radius * math.cos(angle), radius * math.sin(angle)
+            truth[t] = (x, y, yaw)
+            events.append({"t": t, "type": "pose", "x": x + rng.normal(0, 0.1), "y": y + rng.normal(0, 0.1),
+                           "yaw": math.degrees(yaw) + rng.normal(0, 3.0)})
+    # Start the filter from the first fix
+    first = next(i for i, event in enumerate(events) if event["type"] == "pose")
+    return events[first:], truth
+
+
+def bench_updates(repeat):
+    pose_filter = PoseFilter()
+    pose_filter.reset({"x": 0.0, "y": 0.0, "yaw": 0.0})
+    fix = {"x": 0.05, "y": -0.02, "yaw": 1.0}
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        pose_filter.predict(0.005, (0.1, 0.0), 5.0)
+    predict_us = (time.perf_counter() - start) / repeat * 1e6
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        pose_filter.update(fix)
+    update_us = (time.perf_counter() - start) / repeat * 1e6
+    print(f"  predict (IMU sample)   {predict_us:7.2f} us")
+    print(f"  update (tag fix)       {update_us:7.2f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and replay the IMU / AprilTag pose filter")
+    parser.add_argument("--log", help="Replay a recorded JSONL log instead of a simulated walk")
+    parser.add_argument("--save", help="Save the simulated log to this JSONL file")
+    parser.add_argument("--repeat", type=int, default=100000)
+    args = parser.parse_args()
+
+    print("Per-call cost:")
+    bench_updates(args.repeat)
+
+    if args.log:
+        events, truth = load_log(args.log), {}
+    else:
+        events, truth = simulate_log()
+        if args.save:
+            with open(args.save, "w") as f:
+                for event in events:
+                    f.write(json.dumps(event) + "\n")
+
+    start = time.perf_counter()
+    poses = list(replay(events))
+    elapsed = time.perf_counter() - start
+    print(f"Replayed {len(events)} events in {elapsed * 1e3:.1f} ms ({elapsed / len(events) * 1e6:.2f} us/event)")
+
+    if truth:
+        fixes = {event["t"]: event for event in events if event["type"] == "pose"}
+        raw = [math.hypot(fixes[t]["x"] - x, fixes[t]["y"] - y) for t, (x, y, _) in truth.items() if t in fixes]
+        filtered = [math.hypot(pose["x"] - truth[t][0], pose["y"] - truth[t][1])
+                    for t, pose in poses if t in truth and pose is not None]
+        print(f"Position RMS error: fixes {np.sqrt(np.mean(np.square(raw))):.3f} m, "
+              f"filtered {np.sqrt(np.mean(np.square(filtered))):.3f} m")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import os
+import time
+import apriltag
+import cv2
+import numpy as np
+from src import apriltag_detection_pnp, calculate_pose_pnp
+from benchmark_detection import (iphone_camera_matrix, load_apriltag_dict, load_frames, real_tag_size,
+                                 reprojection_error, script_dir)
+
+
+# Function to time one solver over every detected tag, returning (us per solve, solutions)
+def time_method(tags, camera_matrix, dist_coeffs, object_points, method, guesses, repeat):
+    solutions = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        solutions = [calculate_pose_pnp.pnp(corners, camera_matrix, dist_coeffs, real_tag_size, object_points,
+                                            method, guess)
+                     for corners, guess in zip(tags, guesses)]
+    elapsed = time.perf_counter() - start
+    return elapsed / (repeat * len(tags)) * 1e6, solutions
+
+
+# Function to make a tracking-like guess: the pose off by a small random rotation and shift
+def perturb_pose(rvec, tvec, rng, rotation_deg, translation_m):
+    axis = rng.normal(size=3)
+    axis *= np.radians(rng.normal(0, rotation_deg)) / np.linalg.norm(axis)
+    delta, _ = cv2.Rodrigues(axis)
+    rotation, _ = cv2.Rodrigues(np.asarray(rvec, dtype=np.float64))
+    rvec, _ = cv2.Rodrigues(delta @ rotation)
+    return rvec, np.asarray(tvec, dtype=np.float64) + rng.normal(0, translation_m, size=(3, 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark of the solvePnP methods on the sample images")
+    parser.add_argument("--images", default=os.path.join(script_dir, "images"))
+    parser.add_argument("--resize", type=float, default=1.0,
+                        help="Scale applied to the images before detection (the samples are stored at 1330x997)")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--guess-rotation", type=float, default=3.0,
+                        help="Std of the warm-start guess rotation error, degrees")
+    parser.add_argument("--guess-translation", type=float, default=0.03,
+                        help="Std of the warm-start guess translation error, meters")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    frames = load_frames(args.images, args.resize)
+    if not frames:
+        print(f"No images found in {args.images}")
+        return
+    height, width = frames[0][1].shape
+    camera_matrix = iphone_camera_matrix(width, height)
+    dist_coeffs = np.zeros((1, 5))
+    object_points = calculate_pose_pnp.tag_object_points(real_tag_size)
+
+    # Detect once; only the PnP step is timed
+    apriltag_dict = load_apriltag_dict()
+    detector = apriltag.Detector()
+    tags = [tag["corners"] for _, gray in frames
+            for tag in apriltag_detection_pnp.detect_apriltags(gray, apriltag_dict, detector, refine=True)]
+    if not tags:
+        print("No tags detected.")
+        return
+    print(f"{len(tags)} tags in {len(frames)} images, {args.repeat} solves each")
+
+    # Warm starts get the reference pose with tracking-sized noise, like a previous frame's
+    # pose, rather than the converged answer itself
+    _, reference = time_method(tags, camera_matrix, dist_coeffs, object_points, "iterative", [None] * len(tags), 1)
+    rng = np.random.default_rng(args.seed)
+    warm_guesses = [perturb_pose(rvec, tvec, rng, args.guess_rotation, args.guess_translation) if success else None
+                    for rvec, tvec, success in reference]
+
+    print(f"  {'method':<14} {'start':<6} {'us/solve':>9} {'reproj px':>10} {'max dt (m)':>11}")
+    for method in calculate_pose_pnp.PNP_METHODS:
+        for start, guesses in (("cold", [None] * len(tags)), ("warm", warm_guesses)):
+            us, solutions = time_method(tags, camera_matrix, dist_coeffs, object_points, method, guesses,
+                                        args.repeat)
+            errors = [reprojection_error(corners, camera_matrix, dist_coeffs, method, guess)
+                      for corners, guess in zip(tags, guesses)]
+            errors = [e for e in errors if e is not None]
+            offsets = [np.linalg.norm(tvec - ref_tvec) for (_, tvec, ok), (_, ref_tvec, ref_ok)
+                       in zip(solutions, reference) if ok and ref_ok]
+            mean_error = f"{np.mean(errors):10.3f}" if errors else f"{'-':>10}"
+            max_offset = f"{max(offsets):11.4f}" if offsets else f"{'-':>11}"
+            print(f"  {method:<14} {start:<6} {us:9.1f} {mean_error} {max_offset}")
+
+
+if __name__ == "__main__":
+    main()
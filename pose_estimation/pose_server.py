@@ -0,0 +1,316 @@
+import argparse
+import asyncio
+import bisect
+import glob
+import json
+import os
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from src import frame_ingest, navigate, pose_estimator
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SOCKET = "/tmp/pose_server.sock"
+HEADER = struct.Struct("!I")    # length prefix of every message
+STAGES = ["queue", "decode", "detect", "pose", "total"]
+
+real_tag_size = 0.1
+# Glasses Camera (320 x 240 frames)
+camera_matrix = np.array([[657, 0, 312.18],
+                          [0, 657.26, 241.739],
+                          [0, 0, 1]])
+dist_coeffs = np.zeros((1, 5))
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram in milliseconds.
+    """
+    BOUNDS = [0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.total = 0
+        self.sum = 0.0
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(self.BOUNDS, ms)] += 1
+        self.total += 1
+        self.sum += ms
+
+    def percentile(self, q):
+        """
+        Returns the upper bound of the bucket holding the q-th percentile (inf if above all).
+        """
+        if self.total == 0:
+            return None
+        rank = q / 100 * self.total
+        seen = 0
+        for bound, count in zip(self.BOUNDS + [float("inf")], self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def as_dict(self):
+        labels = [f"<={b}" for b in self.BOUNDS] + [f">{self.BOUNDS[-1]}"]
+        return {
+            "count": self.total,
+            "mean_ms": self.sum / self.total if self.total else None,
+            "p50_ms": self.percentile(50),
+            "p99_ms": self.percentile(99),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+# Message framing: a 4-byte length, a JSON header, and for frames a second length-prefixed payload
+async def read_message(reader):
+    size, = HEADER.unpack(await reader.readexactly(HEADER.size))
+    header = json.loads(await reader.readexactly(size))
+    if not isinstance(header, dict):
+        raise ValueError("header must be a JSON object")
+    payload = None
+    if header.get("type") == "frame":
+        size, = HEADER.unpack(await reader.readexactly(HEADER.size))
+        payload = await reader.readexactly(size)
+    return header, payload
+
+
+def write_message(writer, header, payload=None):
+    data = json.dumps(header).encode()
+    writer.write(HEADER.pack(len(data)) + data)
+    if payload is not None:
+        writer.write(HEADER.pack(len(payload)))
+        writer.write(payload)
+
+
+# Function to check the fields of a frame header, raising ValueError for bad values
+def check_frame_header(header):
+    width = header.get("width", frame_ingest.FRAME_WIDTH)
+    height = header.get("height", frame_ingest.FRAME_HEIGHT)
+    for name, value in (("width", width), ("height", height)):
+        if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+            raise ValueError(f"{name} must be a positive integer, got {value!r}")
+    target = header.get("target_tag_id")
+    if target is not None and (not isinstance(target, int) or isinstance(target, bool)):
+        raise ValueError(f"target_tag_id must be an integer or null, got {target!r}")
+    return width, height, target
+
+
+class PoseServer:
+    """
+    Serves pose and navigation results for YUV420 frames sent over a local socket.
+
+    Detection and PnP run in a thread pool (OpenCV and apriltag release the GIL), with one
+    PoseEstimator per pool thread. Each client has a one-frame mailbox: when frames arrive
+    faster than they are processed, the waiting frame is replaced by the newest one, so a
+    slow frame never builds a backlog.
+
+    Frame header: {"type": "frame", "id", "width", "height", "target_tag_id"} followed by
+    the I420 bytes. Reply: {"id", "pose", "navigation": [direction, angle, distance],
+    "latency_ms": {stage: ms}, "dropped"}, or {"id", "error"} for a malformed message or
+    frame. A {"type": "stats"} message returns the per-stage latency histograms.
+    """
+    def __init__(self, json_path, workers=4):
+        self.json_path = json_path
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.local = threading.local()
+        self.histograms = {stage: LatencyHistogram() for stage in STAGES}
+        self.dropped = 0
+
+    def _estimator(self):
+        estimator = getattr(self.local, "estimator", None)
+        if estimator is None:
+            estimator = self.local.estimator = pose_estimator.PoseEstimator.from_json(
+                self.json_path, camera_matrix, dist_coeffs, real_tag_size, fused=True)
+        return estimator
+
+    def process_frame(self, header, payload):
+        # Runs in a pool thread
+        width, height, target = check_frame_header(header)
+        estimator = self._estimator()
+        timings = {}
+        start = time.perf_counter()
+        gray = frame_ingest.yuv420_gray(payload, width, height)
+        decoded = time.perf_counter()
+        detected_info = estimator.detect(gray)
+        detected = time.perf_counter()
+        pose = estimator.estimate(detected_info)
+        solved = time.perf_counter()
+        timings["decode"] = (decoded - start) * 1e3
+        timings["detect"] = (detected - decoded) * 1e3
+        timings["pose"] = (solved - detected) * 1e3
+
+        result = {"id": header.get("id"), "tag_ids": [tag["id"] for tag in detected_info],
+                  "pose": None, "navigation": None}
+        if pose is not None:
+            result["pose"] = {"x": pose["x"], "y": pose["y"], "yaw": pose["yaw"],
+                              "reprojection_error": pose.get("reprojection_error")}
+            if target is not None and target in estimator.apriltag_dict:
+                relative_angle, distance = estimator.navigation(pose, target)
+                result["navigation"] = [navigate.turn_direction(relative_angle), float(relative_angle),
+                                        float(distance)]
+        return result, timings
+
+    async def handle_client(self, reader, writer):
+        mailbox = {"frame": None, "dropped": 0}
+        ready = asyncio.Event()
+        done = False
+
+        async def receive():
+            nonlocal done
+            try:
+                while True:
+                    try:
+                        header, payload = await read_message(reader)
+                    except ValueError as e:
+                        # Malformed header: report it and keep serving this client
+                        write_message(writer, {"id": None, "error": f"Bad message: {e}"})
+                        await writer.drain()
+                        continue
+                    if header.get("type") == "stats":
+                        write_message(writer, {"type": "stats", "dropped": self.dropped,
+                                               "stages": {s: h.as_dict() for s, h in self.histograms.items()}})
+                        await writer.drain()
+                        continue
+                    if mailbox["frame"] is not None:
+                        # Latest frame wins: the one still waiting is dropped
+                        mailbox["dropped"] += 1
+                        self.dropped += 1
+                    mailbox["frame"] = (header, payload, time.perf_counter())
+                    ready.set()
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass
+            finally:
+                done = True
+                ready.set()
+
+        async def process():
+            loop = asyncio.get_running_loop()
+            while True:
+                if mailbox["frame"] is None:
+                    if done:
+                        return
+                    await ready.wait()
+                    ready.clear()
+                    continue
+                header, payload, arrived = mailbox["frame"]
+                mailbox["frame"] = None
+                started = time.perf_counter()
+                try:
+                    result, timings = await loop.run_in_executor(self.pool, self.process_frame, header, payload)
+                except Exception as e:
+                    # A bad frame (wrong size, bad header values, an OpenCV error, ...) only
+                    # fails itself; the client keeps being served
+                    error = str(e) if isinstance(e, ValueError) else f"{type(e).__name__}: {e}"
+                    write_message(writer, {"id": header.get("id"), "error": error, "dropped": mailbox["dropped"]})
+                    await writer.drain()
+                    continue
+                timings["queue"] = (started - arrived) * 1e3
+                timings["total"] = (time.perf_counter() - arrived) * 1e3
+                for stage, ms in timings.items():
+                    self.histograms[stage].add(ms)
+                result["latency_ms"] = timings
+                result["dropped"] = mailbox["dropped"]
+                write_message(writer, result)
+                await writer.drain()
+
+        receiver = asyncio.create_task(receive())
+        try:
+            await process()
+        except ConnectionError:
+            pass
+        finally:
+            receiver.cancel()
+            writer.close()
+
+    async def serve(self, socket_path=None, host=None, port=None):
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            server = await asyncio.start_unix_server(self.handle_client, path=socket_path)
+            print(f"Pose server listening on {socket_path}")
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port)
+            print(f"Pose server listening on {host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+# Function to turn the sample images into I420 frames of the glasses camera size
+def sample_frames(images_dir, width=frame_ingest.FRAME_WIDTH, height=frame_ingest.FRAME_HEIGHT):
+    frames = []
+    for path in sorted(glob.glob(os.path.join(images_dir, "*.jpg"))):
+        image = cv2.resize(cv2.imread(path), (width, height), interpolation=cv2.INTER_AREA)
+        frames.append(cv2.cvtColor(image, cv2.COLOR_BGR2YUV_I420).tobytes())
+    return frames
+
+
+async def run_client(frames, count, fps, target_tag_id, socket_path=None, host=None, port=None):
+    """
+    Stand-in for the app: streams frames at `fps` and prints the replies and server stats.
+    """
+    if socket_path:
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+
+    async def send():
+        for i in range(count):
+            header = {"type": "frame", "id": i, "width": frame_ingest.FRAME_WIDTH,
+                      "height": frame_ingest.FRAME_HEIGHT, "target_tag_id": target_tag_id}
+            write_message(writer, header, frames[i % len(frames)])
+            await writer.drain()
+            await asyncio.sleep(1.0 / fps)
+        # Give the last frame time to be answered before asking for the stats
+        await asyncio.sleep(0.5)
+        write_message(writer, {"type": "stats"})
+        await writer.drain()
+
+    sender = asyncio.create_task(send())
+    replies = 0
+    while True:
+        header, _ = await read_message(reader)
+        if header.get("type") == "stats":
+            print(json.dumps(header, indent=2))
+            break
+        replies += 1
+        if "error" in header:
+            print(f"frame {header['id']}: error {header['error']}")
+            continue
+        print(f"frame {header['id']}: navigation={header['navigation']} "
+              f"total={header['latency_ms']['total']:.1f} ms dropped={header['dropped']}")
+    await sender
+    writer.close()
+    print(f"{count} frames sent, {replies} replies")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Asyncio pose/navigation server for camera frames")
+    parser.add_argument("mode", choices=["serve", "client"])
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket path ('' to use TCP)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", default=os.path.join(script_dir, "apriltags.json"))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--frames", type=int, default=100, help="Client: number of frames to send")
+    parser.add_argument("--fps", type=float, default=30.0, help="Client: frame rate")
+    parser.add_argument("--target", type=int, default=3, help="Client: target tag ID")
+    args = parser.parse_args()
+
+    if args.mode == "serve":
+        server = PoseServer(args.json, args.workers)
+        try:
+            asyncio.run(server.serve(args.socket, args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+    else:
+        frames = sample_frames(os.path.join(script_dir, "images"))
+        asyncio.run(run_client(frames, args.frames, args.fps, args.target, args.socket, args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
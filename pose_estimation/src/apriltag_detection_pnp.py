@@ -1,64 +1,115 @@
 import cv2
 import apriltag
-import json
-import os
+import logging
+import numpy as np
+from . import render
 
-def detect_and_mark_apriltags(image, apriltag_data): # , output_path):
+logger = logging.getLogger(__name__)
+
+
+def detect_and_mark_apriltags(image, apriltag_data, detector=None, apriltag_dict=None): # , output_path):
+    """
+    Detects the known AprilTags in a BGR image and draws them onto it.
+
+    Kept for scripts that want the marked image; frame loops should call detect_apriltags
+    and only use render.draw_detections when an overlay is needed.
+
+    Returns:
+        tuple: (detected tags, the marked image)
+    """
     # Load the image
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
 
     # Create a dictionary for quick lookup by tag ID
-    apriltag_dict = {tag['id']: tag for tag in apriltag_data['apriltags']}
-
-    # Initialize the AprilTag detector
-    detector = apriltag.Detector()
+    if apriltag_dict is None:
+        apriltag_dict = {tag['id']: tag for tag in apriltag_data['apriltags']}
 
-    # Detect AprilTags in the image
-    results = detector.detect(gray)
+    # Initialize the AprilTag detector, unless the caller keeps one around
+    if detector is None:
+        detector = apriltag.Detector()
 
-    # List to store corners, center, and orientation of detected AprilTags
-    detected_tag_info = []
-
-    # Loop over the detected results
-    for r in results:
-        tag_id = r.tag_id  # Get the detected tag ID
-
-        # Check if the detected tag ID is in the apriltag_dict
-        if tag_id in apriltag_dict:
-            tag_info = apriltag_dict[tag_id]  # Fetch metadata
-            name = tag_info["name"]  # Use only the name
-
-            # Extract the bounding box (four corners) of the tag
-            (ptA, ptB, ptC, ptD) = r.corners
-            ptA = (int(ptA[0]), int(ptA[1]))
-            ptB = (int(ptB[0]), int(ptB[1]))
-            ptC = (int(ptC[0]), int(ptC[1]))
-            ptD = (int(ptD[0]), int(ptD[1]))
-
-            # Draw the bounding box of the AprilTag
-            cv2.line(image, ptA, ptB, (0, 255, 0), 2)
-            cv2.line(image, ptB, ptC, (0, 255, 0), 2)
-            cv2.line(image, ptC, ptD, (0, 255, 0), 2)
-            cv2.line(image, ptD, ptA, (0, 255, 0), 2)
-
-            # Draw the center (x, y) of the tag
-            (cX, cY) = (int(r.center[0]), int(r.center[1]))
-            cv2.circle(image, (cX, cY), 5, (0, 0, 255), -1)
-
-            # Append the tag's info
-            detected_tag_info.append({
-                "id": tag_id,
-                "name": name,
-                "center": (cX, cY),
-                "corners": [ptD, ptC, ptB, ptA]
-            })
-            # print("======================================")
-            print(f"AprilTag {detected_tag_info[0]['id']} ({detected_tag_info[0]['name']})")
-            # print(f"  Center: {detected_tag_info[0]['center']}")
-            # print(f"  Corners: {detected_tag_info[0]['corners']}")
+    # Detect AprilTags in the image and draw their bounding boxes and centers
+    detected_tag_info = detect_apriltags(gray, apriltag_dict, detector)
+    render.draw_detections(image, detected_tag_info)
+    for tag in detected_tag_info:
+        logger.debug("AprilTag %s (%s)", tag["id"], tag["name"])
 
     # # Save the image with marked AprilTags
     # cv2.imwrite(output_path, image)
 
     # Return the list of detected tags with their corners, center, and pose (translation and rotation)
-    return detected_tag_info, image
\ No newline at end of file
+    return detected_tag_info, image
+
+
+# Sub-pixel refinement parameters
+SUBPIX_WINDOW = 3
+SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.01)
+
+
+# Function to refine tag corners on the full-resolution image
+def refine_corners(gray, corners, window=SUBPIX_WINDOW):
+    """
+    Refines corner estimates with cv2.cornerSubPix.
+
+    Args:
+        gray (numpy array): Full-resolution 8-bit grayscale image.
+        corners (numpy array): (N, 2) float32 corners in `gray` pixel coordinates.
+        window (int): Half size of the search window in pixels.
+
+    Returns:
+        numpy array: (N, 2) float32 refined corners.
+    """
+    corners = np.ascontiguousarray(corners, dtype=np.float32).reshape(-1, 1, 2)
+    cv2.cornerSubPix(gray, corners, (window, window), (-1, -1), SUBPIX_CRITERIA)
+    return corners.reshape(-1, 2)
+
+
+def detect_apriltags(gray, apriltag_dict, detector, offset=(0, 0), decimate=1, refine=False):
+    """
+    Detects the known AprilTags in a grayscale image, without drawing on it.
+
+    Args:
+        gray (numpy array): 8-bit grayscale image.
+        apriltag_dict (dict): Tag metadata from apriltags.json, keyed by tag ID.
+        detector (apriltag.Detector): A detector reused across frames.
+        offset (tuple): (x, y) of the image's top-left corner in the full frame, when
+            `gray` is a crop. Centers and corners are returned in full-frame coordinates.
+        decimate (float): Detect on the image shrunk by this factor, which is much faster
+            on large frames. Corners are scaled back to full resolution.
+        refine (bool): Refine the corners with cv2.cornerSubPix on the full-resolution image.
+
+    Returns:
+        list: Detected tags in the same format as detect_and_mark_apriltags. With `refine`,
+        "corners" is a (4, 2) float32 array instead of a list of int tuples.
+    """
+    ox, oy = offset
+    if decimate > 1:
+        small = cv2.resize(gray, None, fx=1.0 / decimate, fy=1.0 / decimate, interpolation=cv2.INTER_AREA)
+        scale = (gray.shape[1] / small.shape[1], gray.shape[0] / small.shape[0])
+    else:
+        small = gray
+        scale = (1.0, 1.0)
+
+    detected_tag_info = []
+    for r in detector.detect(small):
+        tag_info = apriltag_dict.get(r.tag_id)
+        if tag_info is None:
+            continue
+        corners = np.asarray(r.corners, dtype=np.float64)[[3, 2, 1, 0]]  # ptD, ptC, ptB, ptA
+        center = np.asarray(r.center, dtype=np.float64)
+        if decimate > 1:
+            # Pixel centres of the small image map to (i + 0.5) * scale - 0.5 in the full image
+            corners = (corners + 0.5) * scale - 0.5
+            center = (center + 0.5) * scale - 0.5
+        if refine:
+            corners = refine_corners(gray, corners, max(SUBPIX_WINDOW, int(round(max(scale)))))
+            corners += (ox, oy)
+        else:
+            corners = [(int(x + ox), int(y + oy)) for x, y in corners]
+        detected_tag_info.append({
+            "id": r.tag_id,
+            "name": tag_info["name"],
+            "center": (int(center[0] + ox), int(center[1] + oy)),
+            "corners": corners
+        })
+    return detected_tag_info
@@ -1,8 +1,31 @@
+import logging
 import numpy as np
 import cv2
 
+logger = logging.getLogger(__name__)
+
+
+# Function to get the 3D object points of a tag in the tag's coordinate frame
+def tag_object_points(tag_size):
+    return np.array([
+        [-tag_size / 2, -tag_size / 2, 0],  # Bottom-left corner
+        [ tag_size / 2, -tag_size / 2, 0],  # Bottom-right corner
+        [ tag_size / 2,  tag_size / 2, 0],  # Top-right corner
+        [-tag_size / 2,  tag_size / 2, 0]   # Top-left corner
+    ], dtype=np.float32)
+
+
+# solvePnP methods selectable by name
+PNP_METHODS = {
+    "iterative": cv2.SOLVEPNP_ITERATIVE,
+    "ippe": cv2.SOLVEPNP_IPPE,
+    "ippe_square": cv2.SOLVEPNP_IPPE_SQUARE,
+    "sqpnp": cv2.SOLVEPNP_SQPNP,
+}
+
+
 # Function to extract the pose of the tag using solvePnP
-def pnp(tag_corners, camera_matrix, dist_coeffs, tag_size):
+def pnp(tag_corners, camera_matrix, dist_coeffs, tag_size, object_points=None, method="iterative", guess=None):
     """
     Calculates translation and rotation using cv2.solvePnP.
     
@@ -11,24 +34,43 @@ def pnp(tag_corners, camera_matrix, dist_coeffs, tag_size):
         camera_matrix (numpy array): The camera intrinsic matrix.
         dist_coeffs (numpy array): The distortion coefficients for the camera.
         tag_size (float): The real-world size of the AprilTag (e.g., width of the tag in meters).
+        object_points (numpy array): Precomputed tag_object_points(tag_size), e.g. from a TagMap.
+        method (str): One of PNP_METHODS. "ippe_square" is the fastest and most stable for a single tag.
+        guess (tuple): (rvec, tvec) of this tag in the previous frame. The iterative solver starts
+            from it; the IPPE solvers use it to pick between their two candidate poses.
 
     Returns:
         tuple: Rotation vector, translation vector, success flag (True if solvePnP succeeds).
     """
     # Define the 3D object points for the AprilTag in the tag's coordinate frame
-    object_points = np.array([
-        [-tag_size / 2, -tag_size / 2, 0],  # Bottom-left corner
-        [ tag_size / 2, -tag_size / 2, 0],  # Bottom-right corner
-        [ tag_size / 2,  tag_size / 2, 0],  # Top-right corner
-        [-tag_size / 2,  tag_size / 2, 0]   # Top-left corner
-    ], dtype=np.float32)
+    if object_points is None:
+        object_points = tag_object_points(tag_size)
 
     # Convert pixel corner points to numpy array for solvePnP
     tag_corners = [tag_corners[i] for i in [3, 2, 1, 0]]  # Reorder to match object_points
     image_points = np.array(tag_corners, dtype=np.float32)
-    
+
+    flags = PNP_METHODS[method]
+    if flags == cv2.SOLVEPNP_IPPE_SQUARE:
+        # IPPE_SQUARE expects the corners as (-s, s), (s, s), (s, -s), (-s, -s): ptD, ptC, ptB, ptA
+        object_points = object_points[::-1]
+        image_points = image_points[::-1]
+
     # Use cv2.solvePnP to calculate rotation and translation vectors
-    success, rvec, tvec = cv2.solvePnP(object_points, image_points, camera_matrix, dist_coeffs)
+    if guess is not None and flags == cv2.SOLVEPNP_ITERATIVE:
+        rvec = np.array(guess[0], dtype=np.float64).reshape(3, 1)
+        tvec = np.array(guess[1], dtype=np.float64).reshape(3, 1)
+        success, rvec, tvec = cv2.solvePnP(object_points, image_points, camera_matrix, dist_coeffs, rvec, tvec,
+                                           useExtrinsicGuess=True, flags=flags)
+    elif guess is not None and flags in (cv2.SOLVEPNP_IPPE, cv2.SOLVEPNP_IPPE_SQUARE):
+        count, rvecs, tvecs, _ = cv2.solvePnPGeneric(object_points, image_points, camera_matrix, dist_coeffs,
+                                                     flags=flags)
+        success = count > 0
+        if success:
+            best = min(range(count), key=lambda i: rotation_distance(rvecs[i], guess[0]))
+            rvec, tvec = rvecs[best], tvecs[best]
+    else:
+        success, rvec, tvec = cv2.solvePnP(object_points, image_points, camera_matrix, dist_coeffs, flags=flags)
     
     if not success:
         return None, None, False
@@ -36,6 +78,14 @@ def pnp(tag_corners, camera_matrix, dist_coeffs, tag_size):
     return rvec, tvec, True
 
 
+# Function to get the angle (radians) between two rotation vectors
+def rotation_distance(rvec_a, rvec_b):
+    rotation_a, _ = cv2.Rodrigues(np.asarray(rvec_a, dtype=np.float64))
+    rotation_b, _ = cv2.Rodrigues(np.asarray(rvec_b, dtype=np.float64))
+    cos_angle = (np.trace(rotation_a.T @ rotation_b) - 1) / 2
+    return np.arccos(np.clip(cos_angle, -1.0, 1.0))
+
+
 # Function to convert the rotation vector (rvec) to Euler angles
 def rvec_to_euler_angles(rvec):
     # Convert the rotation vector to a rotation matrix
@@ -59,55 +109,180 @@ def rvec_to_euler_angles(rvec):
 
 # Main function to calculate the pose (translation, yaw, pitch, roll) using solvePnP
 def calculate_pose(apriltag_data, tag_id, detected_tag_info, camera_matrix, dist_coeffs, tag_size, resize):
+    """
+    Estimates the camera's floor-plan pose from one detected tag.
+
+    Args:
+        apriltag_data: A TagMap, or the apriltags.json dict (compiled into a TagMap on every
+            call, so callers in a loop should pass a TagMap).
+        tag_id (int): The tag to use from detected_tag_info.
+        resize (float): Scale of the image the corners were detected on.
+
+    Returns:
+        dict: {"x", "y", "yaw", "reprojection_error", "covariance"}, or None.
+    """
+    # Imported here because tag_map builds on the helpers of this module
+    from .tag_map import TagMap
+    tag_map = apriltag_data if isinstance(apriltag_data, TagMap) else TagMap(apriltag_data, tag_size)
+    if tag_id not in tag_map:
+        return None
+
     # Extract the corners of the detected AprilTag
     for tag in detected_tag_info:
         if tag["id"] == tag_id:
             tag_corners = tag["corners"]  # These are pixel coordinates (ptA, ptB, ptC, ptD)
-            
+
             # Calculate translation and rotation using solvePnP
-            rvec, tvec, success = pnp(tag_corners, camera_matrix, dist_coeffs, tag_size)
+            rvec, tvec, success = pnp(tag_corners, camera_matrix, dist_coeffs, tag_size, tag_map.object_points)
             if not success:
-                # print(f"Failed to calculate pose for tag ID {tag_id}")
                 return None
-            
-            # Convert rotation vector to Euler angles (yaw, pitch, roll)
-            roll, pitch, yaw = rvec_to_euler_angles(rvec)
-            # print(f"  Roll: {roll:.2f} degrees, Pitch: {pitch:.2f} degrees, Yaw: {yaw:.2f} degrees")
-
-            # Calculate the distance to the tag
-            # print("======================================")
-            tvec_resized = tvec * resize
-            # print(f"resized tvec: {tvec_resized}")
-            t_x = tvec_resized[0][0]
-            t_y = tvec_resized[1][0]
-            t_z = tvec_resized[2][0]
-            distance = t_z
-            print(f"Distance: {distance:.2f} meters")
-
-            # Calculate the angle of the tag from the camera
-            horizontal_angle_rad = np.arctan2(t_x, t_z)
-            horizontal_angle_deg = np.degrees(horizontal_angle_rad)
-            # print(f"Horizontal Angle: {horizontal_angle_deg:.2f} degrees")
-
-            # Get the tag's real-world position and yaw (from apriltag_data)
-            tag_real_position = apriltag_data["apriltags"][tag_id]["position"]
-            tag_real_x, tag_real_y, tag_real_z, tag_real_facing_angle = tag_real_position
-
-            # Calculate the camera's position and yaw
-            camera_yaw = tag_real_facing_angle - 180 - pitch - horizontal_angle_deg
-            camera_x = tag_real_x + distance * (np.sin(np.deg2rad(tag_real_facing_angle)) * np.sin(np.deg2rad(pitch)) + np.cos(np.deg2rad(tag_real_facing_angle)) * np.cos(np.deg2rad(pitch)))
-            camera_y = tag_real_y + distance * (np.sin(np.deg2rad(tag_real_facing_angle)) * np.cos(np.deg2rad(pitch)) - np.cos(np.deg2rad(tag_real_facing_angle)) * np.sin(np.deg2rad(pitch)))
-
-            # print("======================================")
-            # print(f"Camera Position: ({camera_x:.2f}, {camera_y:.2f})")
-            # print(f"Camera Angle: {camera_yaw:.2f} degrees")
-
-            # Return the pose information
-            return {
-                "x": camera_x,
-                "y": camera_y,
-                "yaw": camera_yaw
-            }
-
-        
-    return None  # If no matching tag is found
\ No newline at end of file
+            logger.debug("Distance: %.2f meters", tvec[2][0] * resize)
+
+            # Return the pose information, with its reprojection error and covariance
+            pose = tag_map.camera_pose(tag_id, rvec, tvec * resize)
+            pose["reprojection_error"], pose["covariance"] = pose_quality(
+                tag_map.object_points, corner_points(tag_corners), rvec, tvec, camera_matrix, dist_coeffs,
+                lambda r, t: tag_map.camera_pose(tag_id, r, t * resize))
+            return pose
+
+    return None  # If no matching tag is found
+
+
+# Function to get a tag's detected corners in the order of tag_object_points
+def corner_points(tag_corners):
+    return np.array([tag_corners[i] for i in [3, 2, 1, 0]], dtype=np.float64)
+
+
+# Lower bound on the corner noise used for covariances, in pixels
+MIN_PIXEL_STD = 0.5
+
+
+# Function to score a PnP solution with its reprojection error and pose covariance
+def pose_quality(object_points, image_points, rvec, tvec, camera_matrix, dist_coeffs, to_pose):
+    """
+    Args:
+        object_points (numpy array): (N, 3) points given to solvePnP.
+        image_points (numpy array): (N, 2) matching detected pixel coordinates.
+        rvec, tvec: The PnP solution.
+        to_pose (callable): Maps (rvec, tvec) to the pose dict {"x", "y", "yaw"}.
+
+    Returns:
+        tuple: RMS reprojection error in pixels, and the (3, 3) covariance of (x, y, yaw)
+        in (m, m, rad). The corner noise is estimated from the residual (at least
+        MIN_PIXEL_STD) and propagated through the PnP Jacobian and `to_pose`.
+    """
+    object_points = np.asarray(object_points, dtype=np.float64)
+    rvec = np.asarray(rvec, dtype=np.float64).reshape(3, 1)
+    tvec = np.asarray(tvec, dtype=np.float64).reshape(3, 1)
+    projected, jacobian = cv2.projectPoints(object_points, rvec, tvec, camera_matrix, dist_coeffs)
+    residual = projected.reshape(-1, 2) - image_points
+    reprojection_error = float(np.sqrt(np.mean(np.sum(residual ** 2, axis=1))))
+
+    # Covariance of (rvec, tvec) from the Gauss-Newton approximation
+    # The residual of 6 fitted parameters underestimates the corner noise, so divide
+    # by the degrees of freedom left (2 per corner minus 6)
+    J = jacobian[:, :6]
+    dof = max(residual.size - 6, 1)
+    pixel_var = max(float(np.sum(residual ** 2)) / dof, MIN_PIXEL_STD ** 2)
+    param_cov = pixel_var * np.linalg.pinv(J.T @ J)
+
+    # Jacobian of the floor-plan pose by central differences
+    params = np.concatenate([rvec.ravel(), tvec.ravel()])
+    step = 1e-6
+    pose_jacobian = np.empty((3, 6))
+    for i in range(6):
+        high = params.copy()
+        low = params.copy()
+        high[i] += step
+        low[i] -= step
+        pose_high = to_pose(high[:3].reshape(3, 1), high[3:].reshape(3, 1))
+        pose_low = to_pose(low[:3].reshape(3, 1), low[3:].reshape(3, 1))
+        pose_jacobian[0, i] = pose_high["x"] - pose_low["x"]
+        pose_jacobian[1, i] = pose_high["y"] - pose_low["y"]
+        pose_jacobian[2, i] = np.deg2rad((pose_high["yaw"] - pose_low["yaw"] + 180) % 360 - 180)
+    pose_jacobian /= 2 * step
+    return reprojection_error, pose_jacobian @ param_cov @ pose_jacobian.T
+
+
+# Function to get the rotation from a tag's frame to the world frame
+def tag_world_rotation(facing_angle):
+    """
+    The world frame has x, y on the floor plan and Z pointing down (Z = -height), so it is
+    right-handed and angles measured from x towards y match the yaw of calculate_pose.
+    A tag facing `facing_angle` has its normal pointing from the wall into the room.
+
+    Returns:
+        numpy array: (3, 3) matrix whose columns are the tag's x (to the right of someone
+        facing the tag), y (up) and z (out of the wall) axes in the world frame.
+    """
+    a = np.deg2rad(facing_angle)
+    return np.array([
+        [np.sin(a), 0.0, np.cos(a)],
+        [-np.cos(a), 0.0, np.sin(a)],
+        [0.0, -1.0, 0.0]
+    ])
+
+
+# Function to estimate one camera pose from every detected known tag with a single solvePnP
+def calculate_fused_pose(tag_map, detected_tag_info, camera_matrix, dist_coeffs, ransac=False):
+    """
+    Stacks the world-frame corners of all detected known tags into one PnP problem.
+
+    Args:
+        tag_map (TagMap): Compiled tag geometry, keyed by tag ID.
+        detected_tag_info (list): Output of the tag detection.
+        camera_matrix (numpy array): The camera intrinsic matrix.
+        dist_coeffs (numpy array): The distortion coefficients for the camera.
+        ransac (bool): Use cv2.solvePnPRansac to reject bad corners when several tags are visible.
+
+    Returns:
+        dict: {"x", "y", "yaw", "tag_ids", "reprojection_error", "covariance"} or None. See
+        pose_quality for the reprojection error and covariance.
+    """
+    object_points = []
+    image_points = []
+    tag_ids = []
+    for tag in detected_tag_info:
+        tag_geometry = tag_map.get(tag["id"])
+        if tag_geometry is None:
+            continue
+        object_points.append(tag_geometry.world_corners)
+        image_points.append([tag["corners"][i] for i in [3, 2, 1, 0]])  # ptA, ptB, ptC, ptD
+        tag_ids.append(tag["id"])
+    if not tag_ids:
+        return None
+
+    object_points = np.concatenate(object_points).astype(np.float64)
+    image_points = np.asarray(image_points, dtype=np.float64).reshape(-1, 2)
+    camera_matrix = np.asarray(camera_matrix, dtype=np.float64)
+    dist_coeffs = np.asarray(dist_coeffs, dtype=np.float64)
+
+    # A single tag is planar (IPPE); several tags on different walls are not (SQPnP)
+    flags = cv2.SOLVEPNP_IPPE if len(tag_ids) == 1 else cv2.SOLVEPNP_SQPNP
+    if ransac and len(tag_ids) > 1:
+        success, rvec, tvec, inliers = cv2.solvePnPRansac(object_points, image_points, camera_matrix,
+                                                          dist_coeffs, flags=flags)
+        success = success and inliers is not None and len(inliers) >= 4
+    else:
+        success, rvec, tvec = cv2.solvePnP(object_points, image_points, camera_matrix, dist_coeffs, flags=flags)
+    if not success:
+        return None
+
+    pose = world_camera_pose(rvec, tvec)
+    pose["tag_ids"] = tag_ids
+    pose["reprojection_error"], pose["covariance"] = pose_quality(
+        object_points, image_points, rvec, tvec, camera_matrix, dist_coeffs, world_camera_pose)
+    return pose
+
+
+# Function to get the camera's floor-plan pose from a world-to-camera rvec/tvec
+def world_camera_pose(rvec, tvec):
+    # Camera center and viewing direction in the world frame
+    rotation_matrix, _ = cv2.Rodrigues(np.asarray(rvec, dtype=np.float64))
+    camera_position = -rotation_matrix.T @ np.reshape(tvec, 3)
+    forward = rotation_matrix[2]
+    return {
+        "x": float(camera_position[0]),
+        "y": float(camera_position[1]),
+        "yaw": float(np.degrees(np.arctan2(forward[1], forward[0])))
+    }
@@ -0,0 +1,47 @@
+import cv2
+import numpy as np
+
+# Glasses camera frames
+FRAME_WIDTH = 320
+FRAME_HEIGHT = 240
+
+
+def yuv420_view(frame, width=FRAME_WIDTH, height=FRAME_HEIGHT):
+    """
+    Wraps an I420 (YUV420 planar) frame in a NumPy array without copying it.
+
+    Args:
+        frame: Any buffer-protocol object (bytes, bytearray, memoryview, numpy array, ...).
+        width (int): Frame width in pixels.
+        height (int): Frame height in pixels.
+
+    Returns:
+        numpy array: (height * 3 // 2, width) uint8 view of the frame, as expected by
+        cv2.COLOR_YUV2BGR_I420.
+    """
+    frame_size = width * height * 3 // 2
+    try:
+        data = np.frombuffer(memoryview(frame).cast("B"), dtype=np.uint8)
+    except TypeError:
+        # Objects without the buffer protocol still need one copy
+        data = np.frombuffer(bytes(frame), dtype=np.uint8)
+    if data.size < frame_size:
+        raise ValueError(f"Frame has {data.size} bytes, expected {frame_size} for {width}x{height} YUV420.")
+    return data[:frame_size].reshape(height * 3 // 2, width)
+
+
+def yuv420_gray(frame, width=FRAME_WIDTH, height=FRAME_HEIGHT):
+    """
+    Returns the Y (luma) plane of an I420 frame as a (height, width) grayscale view.
+
+    The Y plane is the grayscale image the AprilTag detector needs, so no color
+    conversion or copy is done.
+    """
+    return yuv420_view(frame, width, height)[:height]
+
+
+def yuv420_to_bgr(frame, width=FRAME_WIDTH, height=FRAME_HEIGHT):
+    """
+    Converts an I420 frame to BGR, for display or saving marked images.
+    """
+    return cv2.cvtColor(yuv420_view(frame, width, height), cv2.COLOR_YUV2BGR_I420)
@@ -45,9 +45,25 @@ def calculate_navigation(user_pose, target_tag_id, json_path):
     # Get the pose of the target AprilTag
     tag_pose = apriltag_poses[target_tag_id][1]
 
-    # Calculate direction vector to the target AprilTag
-    direction_vector = np.array(tag_pose[:2]) - np.array(user_pose[:2])
-    relative_angle = np.degrees(np.arctan2(direction_vector[1], direction_vector[0])) - user_pose[2]
+    return navigation_to(user_pose, tag_pose)
+
+def navigation_to(user_pose, target_position):
+    """
+    Returns the angle (relative to the user's heading) and distance to a target (x, y, ...) position.
+    """
+    # Calculate direction vector to the target
+    direction_vector = np.array(target_position[:2]) - np.array(user_pose[:2])
+    # Normalized to [0, 360) so the result does not depend on the range of the pose's yaw
+    relative_angle = (np.degrees(np.arctan2(direction_vector[1], direction_vector[0])) - user_pose[2]) % 360
     distance_to_tag = np.linalg.norm(direction_vector)
 
-    return relative_angle, distance_to_tag
\ No newline at end of file
+    return relative_angle, distance_to_tag
+
+def turn_direction(relative_angle):
+    """
+    Returns "done" when the target is within 30 degrees of straight ahead, otherwise
+    "left" or "right" for a relative angle in [0, 360) from navigation_to.
+    """
+    if relative_angle < 30 or relative_angle > 330:
+        return "done"
+    return "left" if relative_angle > 180 else "right"
@@ -0,0 +1,132 @@
+import json
+import apriltag
+import cv2
+import numpy as np
+from . import apriltag_detection_pnp, calculate_pose_pnp, navigate
+from .tag_map import TagMap
+from .tag_tracker import FULL_SCAN_EVERY, TagTracker
+
+
+class PoseEstimator:
+    """
+    Long-lived pose estimation session.
+
+    Holds everything that used to be rebuilt for every frame: the AprilTag detector,
+    the tag table from apriltags.json, the camera intrinsics and the grayscale buffer,
+    so each frame only pays for detection and PnP.
+
+    With `tracking=True`, frames after a detection are only searched around the tags
+    found previously (see TagTracker), with a full-frame scan every `full_scan_every` frames.
+    `decimate` and `refine` are passed to detect_apriltags: detect on a shrunk frame, then
+    refine the corners to sub-pixel float32 at full resolution.
+    With `fused=True`, every visible known tag goes into one solvePnP (calculate_fused_pose)
+    instead of using the first detected tag only.
+    `pnp_method` selects the single-tag solver (see calculate_pose_pnp.PNP_METHODS); with
+    `warm_start=True` each tag's previous rvec/tvec seeds the next solve while it stays visible.
+    """
+    def __init__(self, apriltag_data, camera_matrix, dist_coeffs, tag_size, resize=1.0,
+                 tracking=False, full_scan_every=FULL_SCAN_EVERY, decimate=1, refine=False,
+                 fused=False, ransac=False, pnp_method="iterative", warm_start=False):
+        self.apriltag_data = apriltag_data
+        self.apriltag_dict = {tag['id']: tag for tag in apriltag_data['apriltags']}
+        self.camera_matrix = np.asarray(camera_matrix, dtype=np.float64)
+        self.dist_coeffs = np.asarray(dist_coeffs, dtype=np.float64)
+        self.tag_size = tag_size
+        self.tag_map = TagMap(apriltag_data, tag_size)
+        self.resize = resize
+        self.detector = apriltag.Detector()
+        self.decimate = decimate
+        self.refine = refine
+        self.fused = fused
+        self.ransac = ransac
+        self.pnp_method = pnp_method
+        self.warm_start = warm_start
+        self._pnp_guess = {}    # tag ID -> (rvec, tvec) from the previous frame
+        self._gray = None
+        self.tracker = None
+        if tracking:
+            self.tracker = TagTracker(self.detector, self.apriltag_dict, full_scan_every,
+                                      decimate=decimate, refine=refine)
+
+    @classmethod
+    def from_json(cls, json_path, camera_matrix, dist_coeffs, tag_size, resize=1.0, **kwargs):
+        with open(json_path, 'r') as f:
+            apriltag_data = json.load(f)
+        return cls(apriltag_data, camera_matrix, dist_coeffs, tag_size, resize, **kwargs)
+
+    def to_gray(self, image):
+        """
+        Converts a BGR frame to grayscale into a buffer reused across frames of the same size.
+        """
+        if image.ndim == 2:
+            return image
+        if self._gray is None or self._gray.shape != image.shape[:2]:
+            self._gray = np.empty(image.shape[:2], dtype=np.uint8)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=self._gray)
+
+    def detect(self, image):
+        """
+        Returns the known tags detected in a BGR or grayscale frame.
+        """
+        gray = self.to_gray(image)
+        if self.tracker is not None:
+            return self.tracker.detect(gray)
+        return apriltag_detection_pnp.detect_apriltags(gray, self.apriltag_dict, self.detector,
+                                                       decimate=self.decimate, refine=self.refine)
+
+    def process(self, frame):
+        """
+        Estimates the camera pose from one frame.
+
+        Returns:
+            dict: {"x", "y", "yaw", "tag_id", "reprojection_error", "covariance"}, or None.
+            Fused poses also have "tag_ids".
+        """
+        return self.estimate(self.detect(frame))
+
+    def estimate(self, detected_info):
+        """
+        Estimates the camera pose from the output of detect().
+        """
+        if len(detected_info) == 0:
+            return None
+
+        if self.fused:
+            pose = calculate_pose_pnp.calculate_fused_pose(self.tag_map, detected_info, self.camera_matrix,
+                                                           self.dist_coeffs, self.ransac)
+            if pose is not None:
+                pose["tag_id"] = pose["tag_ids"][0]
+            return pose
+
+        tag = detected_info[0]
+        if tag["id"] not in self.tag_map:
+            return None
+        guess = self._pnp_guess.get(tag["id"]) if self.warm_start else None
+        rvec, tvec, success = calculate_pose_pnp.pnp(tag["corners"], self.camera_matrix, self.dist_coeffs,
+                                                     self.tag_size, self.tag_map.object_points,
+                                                     self.pnp_method, guess)
+        if self.warm_start:
+            # Only keep the guess of a tag seen in consecutive frames
+            self._pnp_guess = {tag["id"]: (rvec, tvec)} if success else {}
+        if not success:
+            return None
+        pose = self.tag_map.camera_pose(tag["id"], rvec, tvec * self.resize)
+        pose["tag_id"] = tag["id"]
+        pose["reprojection_error"], pose["covariance"] = calculate_pose_pnp.pose_quality(
+            self.tag_map.object_points, calculate_pose_pnp.corner_points(tag["corners"]), rvec, tvec,
+            self.camera_matrix, self.dist_coeffs, lambda r, t: self.tag_map.camera_pose(tag["id"], r, t * self.resize))
+        return pose
+
+    def process_stream(self, frames):
+        """
+        Yields the pose (or None) for every frame of an iterable.
+        """
+        for frame in frames:
+            yield self.process(frame)
+
+    def navigation(self, pose, target_tag_id):
+        """
+        Returns (relative_angle, distance) from a pose to one of the known tags.
+        """
+        twoD_pose = [pose["x"], pose["y"], pose["yaw"]]
+        return navigate.navigation_to(twoD_pose, self.apriltag_dict[target_tag_id]["position"])
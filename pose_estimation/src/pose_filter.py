@@ -0,0 +1,239 @@
+import json
+import math
+import numpy as np
+
+# Default noise parameters
+ACCEL_NOISE = 0.5           # m/s^2, IMU acceleration noise
+GYRO_NOISE = 2.0            # deg/s, IMU yaw-rate noise
+FIX_POSITION_STD = 0.15     # m, standard deviation of a tag fix position
+FIX_YAW_STD = 5.0           # deg, standard deviation of a tag fix yaw
+
+X, Y, YAW, VX, VY, YAW_RATE = range(6)
+
+
+def wrap_angle(angle):
+    """
+    Wraps an angle in radians to [-pi, pi).
+    """
+    return (angle + math.pi) % (2 * math.pi) - math.pi
+
+
+def invert3(m, out):
+    """
+    Inverts a 3x3 matrix into `out` by its adjugate, without allocating arrays.
+    """
+    a, b, c = m[0]
+    d, e, f = m[1]
+    g, h, i = m[2]
+    A = e * i - f * h
+    B = f * g - d * i
+    C = d * h - e * g
+    inv_det = 1.0 / (a * A + b * B + c * C)
+    out[0, 0] = A * inv_det
+    out[0, 1] = (c * h - b * i) * inv_det
+    out[0, 2] = (b * f - c * e) * inv_det
+    out[1, 0] = B * inv_det
+    out[1, 1] = (a * i - c * g) * inv_det
+    out[1, 2] = (c * d - a * f) * inv_det
+    out[2, 0] = C * inv_det
+    out[2, 1] = (b * g - a * h) * inv_det
+    out[2, 2] = (a * e - b * d) * inv_det
+    return out
+
+
+class PoseFilter:
+    """
+    Extended Kalman filter over [x, y, yaw, vx, vy, yaw_rate].
+
+    Propagated with IMU samples (predict) and corrected with AprilTag pose fixes (update).
+    Poses use the frame of calculate_pose: meters, and yaw in degrees measured from x
+    towards y. IMU accelerations are in the body frame (forward, right) in m/s^2 and the
+    yaw rate is in deg/s with the same sign as the pose yaw.
+
+    A measured yaw rate is a control input: predict sets the yaw-rate state to it with
+    the gyro noise as its variance. Without a gyro sample the yaw rate is a random walk.
+
+    All matrices are allocated once; predict, mahalanobis and update write into them in
+    place.
+    """
+    def __init__(self, accel_noise=ACCEL_NOISE, gyro_noise=GYRO_NOISE,
+                 fix_position_std=FIX_POSITION_STD, fix_yaw_std=FIX_YAW_STD):
+        self.accel_var = accel_noise ** 2
+        self.gyro_var = math.radians(gyro_noise) ** 2
+        self.state = np.zeros(6)
+        self.covariance = np.eye(6)
+        self.initialized = False
+        self.time = None
+        self.default_fix_covariance = np.diag([fix_position_std ** 2, fix_position_std ** 2,
+                                               math.radians(fix_yaw_std) ** 2])
+
+        # Work buffers
+        self._F = np.eye(6)
+        self._Q = np.zeros((6, 6))
+        self._FP = np.zeros((6, 6))
+        self._innovation = np.zeros(3)
+        self._S = np.zeros((3, 3))
+        self._S_inv = np.zeros((3, 3))
+        self._Sy = np.zeros(3)
+        self._dx = np.zeros(6)
+        self._K = np.zeros((6, 3))
+        self._KHP = np.zeros((6, 6))
+
+    def reset(self, pose, t=None, covariance=None):
+        """
+        Starts the filter at a pose {"x", "y", "yaw"} with zero velocity.
+        """
+        self.state[:] = (pose["x"], pose["y"], math.radians(pose["yaw"]), 0.0, 0.0, 0.0)
+        self.covariance[:] = np.eye(6)
+        self.covariance[:3, :3] = self.default_fix_covariance if covariance is None else covariance
+        self.initialized = True
+        self.time = t
+
+    def predict(self, dt, accel=(0.0, 0.0), yaw_rate=None):
+        """
+        Propagates the state by `dt` seconds with a body-frame acceleration and a measured
+        yaw rate (deg/s). Without a yaw rate the current estimate is kept (constant turn).
+        """
+        if dt <= 0:
+            return
+        s = self.state
+        P = self.covariance
+        Q = self._Q
+        if yaw_rate is not None:
+            s[YAW_RATE] = math.radians(yaw_rate)
+            # Control input: the rate is known up to the gyro noise and uncorrelated with the rest
+            P[YAW_RATE, :] = 0.0
+            P[:, YAW_RATE] = 0.0
+            P[YAW_RATE, YAW_RATE] = self.gyro_var
+            Q[YAW_RATE, YAW_RATE] = 0.0
+        else:
+            Q[YAW_RATE, YAW_RATE] = self.gyro_var * dt
+        c = math.cos(s[YAW])
+        sn = math.sin(s[YAW])
+        ax = c * accel[0] - sn * accel[1]
+        ay = sn * accel[0] + c * accel[1]
+        half_dt2 = 0.5 * dt * dt
+
+        s[X] += s[VX] * dt + ax * half_dt2
+        s[Y] += s[VY] * dt + ay * half_dt2
+        s[VX] += ax * dt
+        s[VY] += ay * dt
+        s[YAW] = wrap_angle(s[YAW] + s[YAW_RATE] * dt)
+
+        # Jacobian of the motion model, including how yaw rotates the acceleration
+        F = self._F
+        F[X, VX] = F[Y, VY] = F[YAW, YAW_RATE] = dt
+        F[X, YAW] = -ay * half_dt2
+        F[Y, YAW] = ax * half_dt2
+        F[VX, YAW] = -ay * dt
+        F[VY, YAW] = ax * dt
+
+        # Process noise: white acceleration on x/y. Yaw picks up the gyro noise through
+        # F[YAW, YAW_RATE], so it gets no noise term of its own
+        q_acc = self.accel_var
+        Q[X, X] = Q[Y, Y] = q_acc * half_dt2 * half_dt2
+        Q[X, VX] = Q[VX, X] = Q[Y, VY] = Q[VY, Y] = q_acc * half_dt2 * dt
+        Q[VX, VX] = Q[VY, VY] = q_acc * dt * dt
+
+        np.matmul(F, P, out=self._FP)
+        np.matmul(self._FP, F.T, out=P)
+        P += Q
+
+    def mahalanobis(self, pose, covariance=None):
+        """
+        Returns the squared Mahalanobis distance of a pose fix from the current estimate,
+        without updating the filter.
+        """
+        s = self.state
+        y = self._innovation
+        y[0] = pose["x"] - s[X]
+        y[1] = pose["y"] - s[Y]
+        y[2] = wrap_angle(math.radians(pose["yaw"]) - s[YAW])
+        np.add(self.covariance[:3, :3], self.default_fix_covariance if covariance is None else covariance,
+               out=self._S)
+        invert3(self._S, self._S_inv)
+        np.dot(self._S_inv, y, out=self._Sy)
+        return float(np.dot(y, self._Sy))
+
+    def update(self, pose, covariance=None):
+        """
+        Corrects the state with a pose fix {"x", "y", "yaw"}.
+
+        Args:
+            pose (dict): The fix, e.g. from calculate_pose.
+            covariance (numpy array): (3, 3) fix covariance in (m, m, rad); defaults to
+                the filter's fix_position_std and fix_yaw_std.
+
+        Returns:
+            float: Squared Mahalanobis distance of the fix from the prediction.
+        """
+        if not self.initialized:
+            self.reset(pose, covariance=covariance)
+            return 0.0
+        s = self.state
+        P = self.covariance
+        y = self._innovation
+        y[0] = pose["x"] - s[X]
+        y[1] = pose["y"] - s[Y]
+        y[2] = wrap_angle(math.radians(pose["yaw"]) - s[YAW])
+
+        # The fix observes the first three states directly, so H P H^T is a block of P
+        S = self._S
+        np.add(P[:3, :3], self.default_fix_covariance if covariance is None else covariance, out=S)
+        S_inv = invert3(S, self._S_inv)
+        np.matmul(P[:, :3], S_inv, out=self._K)
+        np.dot(S_inv, y, out=self._Sy)
+        distance = float(np.dot(y, self._Sy))
+
+        np.dot(self._K, y, out=self._dx)
+        s += self._dx
+        s[YAW] = wrap_angle(s[YAW])
+        np.matmul(self._K, P[:3, :], out=self._KHP)
+        P -= self._KHP
+        return distance
+
+    def pose(self):
+        """
+        Returns the current estimate as {"x", "y", "yaw"} (yaw in degrees), or None.
+        """
+        if not self.initialized:
+            return None
+        return {
+            "x": float(self.state[X]),
+            "y": float(self.state[Y]),
+            "yaw": math.degrees(self.state[YAW])
+        }
+
+    def process(self, event):
+        """
+        Feeds one timestamped log event to the filter.
+
+        IMU events are {"t", "type": "imu", "accel": [forward, right], "yaw_rate"} and
+        tag fixes are {"t", "type": "pose", "x", "y", "yaw"}.
+        """
+        t = event["t"]
+        if event["type"] == "pose":
+            if self.initialized and self.time is not None:
+                self.predict(t - self.time)
+            self.update(event)
+        elif self.initialized:
+            self.predict(t - self.time, event.get("accel", (0.0, 0.0)), event.get("yaw_rate"))
+        self.time = t
+
+
+# Function to read a recorded JSONL log of IMU samples and pose fixes
+def load_log(log_path):
+    with open(log_path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# Function to replay a recorded log through a filter
+def replay(events, pose_filter=None):
+    """
+    Yields (t, pose) after every event, where pose is the filtered estimate (or None
+    before the first fix).
+    """
+    pose_filter = pose_filter or PoseFilter()
+    for event in events:
+        pose_filter.process(event)
+        yield event["t"], pose_filter.pose()
@@ -0,0 +1,85 @@
+import numpy as np
+from .pose_filter import PoseFilter
+
+# Chi-square quantiles for 3 degrees of freedom (x, y, yaw)
+CHI2_ACCEPT = 7.81      # 95%: fixes within this distance are used as they are
+CHI2_REJECT = 16.27     # 99.9%: fixes beyond it are dropped
+MAX_REPROJECTION_ERROR = 4.0    # pixels
+MAX_REJECTIONS = 5      # consecutive rejections before the track is restarted from the fixes
+MAP_POSITION_STD = 0.05 # m, error of the tag positions in apriltags.json
+MAP_YAW_STD = 2.0       # deg, error of the tag facing angles
+
+ACCEPTED = "accepted"
+DOWNWEIGHTED = "downweighted"
+REJECTED = "rejected"
+
+
+class PoseGate:
+    """
+    Checks each pose fix against the recent pose track before it is used for guidance.
+
+    A fix is rejected when its reprojection error is too large or its Mahalanobis distance
+    from the tracked pose (using both the fix and the track covariance) is beyond
+    CHI2_REJECT. Between CHI2_ACCEPT and CHI2_REJECT its covariance is inflated so it only
+    nudges the track. After MAX_REJECTIONS rejections in a row the track is assumed to be
+    wrong and restarts from the next fix.
+    """
+    def __init__(self, pose_filter=None, chi2_accept=CHI2_ACCEPT, chi2_reject=CHI2_REJECT,
+                 max_reprojection_error=MAX_REPROJECTION_ERROR, max_rejections=MAX_REJECTIONS):
+        self.pose_filter = pose_filter or PoseFilter()
+        self.chi2_accept = chi2_accept
+        self.chi2_reject = chi2_reject
+        self.max_reprojection_error = max_reprojection_error
+        self.max_rejections = max_rejections
+        self.map_covariance = np.diag([MAP_POSITION_STD ** 2, MAP_POSITION_STD ** 2, np.deg2rad(MAP_YAW_STD) ** 2])
+        self.rejections = 0
+        self.counts = {ACCEPTED: 0, DOWNWEIGHTED: 0, REJECTED: 0}
+
+    def check(self, pose):
+        """
+        Returns (status, covariance to update the track with) for a pose fix.
+        """
+        covariance = pose.get("covariance")
+        if covariance is not None:
+            # PnP only accounts for corner noise; add the error of the surveyed tag positions
+            covariance = covariance + self.map_covariance
+        if pose.get("reprojection_error", 0.0) > self.max_reprojection_error:
+            return REJECTED, covariance
+        if not self.pose_filter.initialized:
+            return ACCEPTED, covariance
+        distance = self.pose_filter.mahalanobis(pose, covariance)
+        if distance <= self.chi2_accept:
+            return ACCEPTED, covariance
+        if distance <= self.chi2_reject:
+            base = self.pose_filter.default_fix_covariance if covariance is None else covariance
+            return DOWNWEIGHTED, base * (distance / self.chi2_accept)
+        return REJECTED, covariance
+
+    def submit(self, pose, t=None):
+        """
+        Gates a pose fix and updates the track with it.
+
+        Returns:
+            tuple: (status, the tracked pose after this fix, or None if there is no track yet)
+        """
+        pose_filter = self.pose_filter
+        if pose_filter.initialized and t is not None and pose_filter.time is not None:
+            pose_filter.predict(t - pose_filter.time)
+        if t is not None:
+            pose_filter.time = t
+
+        status, covariance = self.check(pose)
+        if status == REJECTED and self.rejections + 1 >= self.max_rejections \
+                and pose.get("reprojection_error", 0.0) <= self.max_reprojection_error:
+            # The fixes keep disagreeing with the track: trust them instead
+            pose_filter.reset(pose, t, covariance)
+            status = ACCEPTED
+        elif not pose_filter.initialized and status != REJECTED:
+            # First fix: start the track at it, keeping the fix time for the next predict
+            pose_filter.reset(pose, t, covariance)
+        elif status != REJECTED:
+            pose_filter.update(pose, covariance)
+
+        self.rejections = self.rejections + 1 if status == REJECTED else 0
+        self.counts[status] += 1
+        return status, pose_filter.pose()
@@ -0,0 +1,33 @@
+import cv2
+import numpy as np
+
+# Overlay colors (BGR)
+BOX_COLOR = (0, 255, 0)
+CENTER_COLOR = (0, 0, 255)
+
+
+# Function to draw detected tags onto an image, for debugging and saved marked images
+def draw_detections(image, detected_tag_info, copy=False):
+    """
+    Draws the bounding box and center of every detected tag.
+
+    Detection itself never draws, so only callers that want an overlay pay for it.
+
+    Args:
+        image (numpy array): BGR (or grayscale) image the tags were detected in.
+        detected_tag_info (list): Output of detect_apriltags.
+        copy (bool): Draw on a copy instead of the image itself.
+
+    Returns:
+        numpy array: The annotated image.
+    """
+    if copy:
+        image = image.copy()
+    # Grayscale images only have one channel, so draw in white
+    box_color, center_color = (BOX_COLOR, CENTER_COLOR) if image.ndim == 3 else (255, 255)
+    for tag in detected_tag_info:
+        # Corners are [ptD, ptC, ptB, ptA], as ints or sub-pixel floats
+        corners = np.rint(np.asarray(tag["corners"], dtype=np.float64)).astype(np.int32)
+        cv2.polylines(image, [corners.reshape(-1, 1, 2)], True, box_color, 2)
+        cv2.circle(image, tuple(int(v) for v in tag["center"]), 5, center_color, -1)
+    return image
@@ -0,0 +1,70 @@
+import json
+import cv2
+import numpy as np
+from .calculate_pose_pnp import tag_object_points, tag_world_rotation
+
+
+class TagGeometry:
+    """
+    Precomputed geometry of one tag: its metadata, the tag-to-world transform and its
+    corners in both frames, in the [ptA, ptB, ptC, ptD] order used by pnp.
+    """
+    def __init__(self, info, object_points):
+        self.id = info["id"]
+        self.name = info["name"]
+        self.info = info
+        self.position = info["position"]
+        tag_x, tag_y, tag_z, facing_angle = self.position
+        self.rotation = tag_world_rotation(facing_angle)
+        self.translation = np.array([tag_x, tag_y, -tag_z], dtype=np.float64)
+        self.transform = np.eye(4)
+        self.transform[:3, :3] = self.rotation
+        self.transform[:3, 3] = self.translation
+        self.world_corners = object_points.astype(np.float64) @ self.rotation.T + self.translation
+
+
+class TagMap:
+    """
+    The tags of apriltags.json compiled once and keyed by tag ID.
+
+    Holds the tag-frame object points shared by every tag and each tag's world transform,
+    so per-frame pose math is a couple of small matrix products.
+    """
+    def __init__(self, apriltag_data, tag_size):
+        self.tag_size = tag_size
+        self.object_points = tag_object_points(tag_size)
+        self.tags = {tag["id"]: TagGeometry(tag, self.object_points) for tag in apriltag_data["apriltags"]}
+
+    @classmethod
+    def from_json(cls, json_path, tag_size):
+        with open(json_path, 'r') as f:
+            return cls(json.load(f), tag_size)
+
+    def __contains__(self, tag_id):
+        return tag_id in self.tags
+
+    def __getitem__(self, tag_id):
+        return self.tags[tag_id]
+
+    def get(self, tag_id):
+        return self.tags.get(tag_id)
+
+    def camera_pose(self, tag_id, rvec, tvec):
+        """
+        Converts a tag-relative PnP result (from pnp) into the camera's world pose.
+
+        Returns:
+            dict: {"x", "y", "yaw"} with yaw in degrees, in the frame of calculate_pose.
+        """
+        tag = self.tags[tag_id]
+        rotation_matrix, _ = cv2.Rodrigues(np.asarray(rvec, dtype=np.float64))
+        # Camera center and viewing direction in the tag frame, then in the world frame
+        camera_in_tag = -rotation_matrix.T @ np.reshape(tvec, 3)
+        camera_position = tag.rotation @ camera_in_tag + tag.translation
+        forward = tag.rotation @ rotation_matrix[2]
+        return {
+            "x": float(camera_position[0]),
+            "y": float(camera_position[1]),
+            "yaw": float(np.degrees(np.arctan2(forward[1], forward[0])))
+        }
+
@@ -0,0 +1,102 @@
+import numpy as np
+from . import apriltag_detection_pnp
+
+# Default tracking parameters
+FULL_SCAN_EVERY = 10    # frames between forced full-frame scans
+ROI_PADDING = 0.5       # padding around the predicted box, as a fraction of its size
+ROI_MIN_PADDING = 16    # minimum padding in pixels
+
+
+class TagTracker:
+    """
+    Region-of-interest tracking for AprilTag detection.
+
+    After a full-frame scan, every following frame only runs the detector on a padded
+    crop around where each tag is predicted to be (its previous box moved by its last
+    displacement). A full-frame scan is done every `full_scan_every` frames, when a
+    tracked tag is missed, or when nothing is being tracked. Returned corners are always
+    in full-frame coordinates, in the same format as detect_apriltags.
+    """
+    def __init__(self, detector, apriltag_dict, full_scan_every=FULL_SCAN_EVERY,
+                 padding=ROI_PADDING, min_padding=ROI_MIN_PADDING, decimate=1, refine=False):
+        self.detector = detector
+        self.apriltag_dict = apriltag_dict
+        self.decimate = decimate
+        self.refine = refine
+        self.full_scan_every = full_scan_every
+        self.padding = padding
+        self.min_padding = min_padding
+        self.tracks = {}    # tag ID -> (corners, displacement of the center since the previous frame)
+        self.frames_since_scan = 0
+        self.full_scans = 0
+        self.roi_scans = 0
+
+    def reset(self):
+        self.tracks = {}
+        self.frames_since_scan = 0
+
+    def predict_roi(self, tag_id, shape):
+        """
+        Returns the (x0, y0, x1, y1) crop where a tracked tag should be in the next frame.
+        """
+        corners, (dx, dy) = self.tracks[tag_id]
+        points = np.asarray(corners, dtype=np.float64) + (dx, dy)
+        low = points.min(axis=0)
+        high = points.max(axis=0)
+        pad = np.maximum((high - low) * self.padding, self.min_padding)
+        height, width = shape[:2]
+        x0, y0 = np.maximum(np.floor(low - pad), 0).astype(int)
+        x1, y1 = np.minimum(np.ceil(high + pad), (width, height)).astype(int)
+        return x0, y0, x1, y1
+
+    def _full_scan(self, gray):
+        self.full_scans += 1
+        self.frames_since_scan = 0
+        return apriltag_detection_pnp.detect_apriltags(gray, self.apriltag_dict, self.detector,
+                                                       decimate=self.decimate, refine=self.refine)
+
+    def _roi_scan(self, gray):
+        # None means a tracked tag was missed and the frame needs a full scan
+        self.roi_scans += 1
+        detected = []
+        for tag_id in self.tracks:
+            x0, y0, x1, y1 = self.predict_roi(tag_id, gray.shape)
+            if x1 - x0 < 8 or y1 - y0 < 8:
+                return None
+            crop = np.ascontiguousarray(gray[y0:y1, x0:x1])
+            # Crops are already small, so only the full-frame scan is decimated
+            found = [tag for tag in apriltag_detection_pnp.detect_apriltags(crop, self.apriltag_dict, self.detector,
+                                                                         offset=(x0, y0), refine=self.refine)
+                     if tag["id"] == tag_id]
+            if not found:
+                return None
+            detected.append(found[0])
+        return detected
+
+    def _update(self, detected):
+        tracks = {}
+        for tag in detected:
+            if tag["id"] in tracks:
+                continue
+            previous = self.tracks.get(tag["id"])
+            if previous is None:
+                motion = (0.0, 0.0)
+            else:
+                old = np.mean(previous[0], axis=0)
+                new = np.mean(tag["corners"], axis=0)
+                motion = (new[0] - old[0], new[1] - old[1])
+            tracks[tag["id"]] = (tag["corners"], motion)
+        self.tracks = tracks
+
+    def detect(self, gray):
+        """
+        Detects the known tags in a grayscale frame, using ROI crops when possible.
+        """
+        detected = None
+        if self.tracks and self.frames_since_scan < self.full_scan_every:
+            detected = self._roi_scan(gray)
+            self.frames_since_scan += 1
+        if detected is None:
+            detected = self._full_scan(gray)
+        self._update(detected)
+        return detected
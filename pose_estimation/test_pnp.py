@@ -1,9 +1,9 @@
 # from src import apriltag_detection_pnp, calculate_pose_pnp, navigate, plot_room
-from apriltag_indoor_navigation.pose_estimation.src import apriltag_detection_pnp, calculate_pose_pnp, navigate, plot_room
+from apriltag_indoor_navigation.pose_estimation.src import navigate, plot_room, pose_estimator, frame_ingest, pose_filter, pose_gate
+import logging
 import numpy as np
-import json
 import os
-import cv2
+import time
 
 
 # # main function
@@ -68,72 +68,102 @@ import cv2
 #     return 0
 
 
+# Camera and tag parameters
+real_tag_size = 0.1
+# iPhone 12 Pro Max
+# camera_focal_length = 26 * image_width / 7.03
+# c_x = round(image_width / 2)
+# c_y = round(image_height / 2)
+# camera_matrix = np.array([[camera_focal_length, 0, c_x],
+#                         [0, camera_focal_length, c_y],
+#                         [0, 0, 1]])
+# Glasses Camera (320 x 240 frames)
+camera_matrix = np.array([[657, 0, 312.18],
+                        [0, 657.26, 241.739],
+                        [0, 0, 1]])
+dist_coeffs = np.zeros((1, 5))
+resize = 1
+
+logger = logging.getLogger(__name__)
+
+# Seconds the IMU-propagated pose is used for guidance after the last tag fix
+max_coast_time = 3.0
+
+_estimator = None
+_pose_filter = pose_filter.PoseFilter()
+_pose_gate = pose_gate.PoseGate(_pose_filter)
+_last_fix_time = None
+
+
+# Function to get the pose estimation session shared by every call to run
+def get_estimator():
+    global _estimator
+    if _estimator is None:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        json_path = os.path.join(script_dir, "apriltags.json")
+        _estimator = pose_estimator.PoseEstimator.from_json(json_path, camera_matrix, dist_coeffs, real_tag_size, resize,
+                                                             fused=True)
+    return _estimator
+
+
+# Function to feed one IMU sample (body-frame m/s^2, yaw rate in deg/s) to the pose filter.
+# `t` must be on the same clock as the one passed to run (time.monotonic by default)
+def imu(accel_forward, accel_right, yaw_rate, t=None):
+    t = time.monotonic() if t is None else t
+    if _pose_filter.initialized:
+        _pose_filter.predict(t - _pose_filter.time, (accel_forward, accel_right), yaw_rate)
+    _pose_filter.time = t
+
+
+# Function to gate a tag fix against the pose track and get the filtered pose, or None if rejected
+def filter_fix(pose, t):
+    global _last_fix_time
+    status, filtered = _pose_gate.submit(pose, t)
+    if status == pose_gate.REJECTED:
+        logger.info("Rejected pose fix (reprojection error %.2f px)", pose.get("reprojection_error", 0.0))
+        return None
+    _last_fix_time = t
+    return filtered
+
+
+# Function to get the IMU-propagated pose between tag sightings, or None if it is too old
+def coasting_pose(t):
+    if _last_fix_time is None or t - _last_fix_time > max_coast_time:
+        return None
+    _pose_filter.predict(t - _pose_filter.time)
+    _pose_filter.time = t
+    return _pose_filter.pose()
+
+
 # main function
-def run(image, target_tag_id):
+def run(image, target_tag_id, width=frame_ingest.FRAME_WIDTH, height=frame_ingest.FRAME_HEIGHT, t=None):
     # parameters
     print("======================================")
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    # print(f"image: {image}")
-    # image_path = os.path.join(script_dir, f"images/{image}.jpg")
-    # print(f"image input type: {type(image)}")
-    # convert
-    python_bytes = bytes(image)
-    yuv_data = np.frombuffer(python_bytes, dtype=np.uint8)
-    # print(np_array.flatten()[0:10])
-    # Reshape to YUV420 format
-    yuv_frame = yuv_data.reshape((360, 320))  # OpenCV expects interleaved format
-    # Convert YUV to BGR
-    bgr_image = cv2.cvtColor(yuv_frame, cv2.COLOR_YUV2BGR_I420)
-    # print(f"image input type after conversion: {type(bgr_image)}")
-    # print("conversion done")
-
-    # image = cv2.imread(image)
-    # output_path4marked = os.path.join(script_dir, f"images_marked/{image}_marked.jpg")
-    # output_path4plot = os.path.join(script_dir, f"images_plot/{image}_plot.jpg")
-    json_path = os.path.join(script_dir, "apriltags.json")
-    real_tag_size = 0.1
-
-    # Calculate the camera matrix
-    org_image_width = 320
-    org_image_height = 240
-    resize = 1
-    image_width = int(org_image_width * resize)
-    image_height = int(org_image_height * resize)
-    # print(f"image_width: {image_width}, image_height: {image_height}")
-    # iPhone 12 Pro Max
-    # camera_focal_length = 26 * image_width / 7.03
-    # c_x = round(image_width / 2)
-    # c_y = round(image_height / 2)
-    # camera_matrix = np.array([[camera_focal_length, 0, c_x],
-    #                         [0, camera_focal_length, c_y],
-    #                         [0, 0, 1]])
-    # Glasses Camera
-    camera_matrix = np.array([[657, 0, 312.18],
-                            [0, 657.26, 241.739],
-                            [0, 0, 1]])
-    dist_coeffs = np.zeros((1, 5))
-
-    # Load the apriltags.json file
-    with open(json_path, 'r') as f:
-        apriltag_data = json.load(f)
+    estimator = get_estimator()
+    # The Y plane of the YUV420 frame is the grayscale image, no conversion needed
+    gray = frame_ingest.yuv420_gray(image, width, height)
+
+    # Frame time, on the same clock as the IMU samples
+    now = time.monotonic() if t is None else t
+
     # Tag detection
-    detected_info, image = apriltag_detection_pnp.detect_and_mark_apriltags(bgr_image, apriltag_data) # , output_path4marked)
-    if len(detected_info) == 0:
+    detected_info = estimator.detect(gray)
+    # One camera pose from every visible tag
+    pose = estimator.estimate(detected_info)
+    if pose is not None:
+        pose = filter_fix(pose, now)
+    elif len(detected_info) == 0:
         print("No AprilTag detected.")
-        return None
-
-    # Extract the first detected tag's pose (translation and rotation)
-    tag_id = detected_info[0]["id"]
-    pose = calculate_pose_pnp.calculate_pose(apriltag_data, tag_id, detected_info, camera_matrix, dist_coeffs, real_tag_size, resize)
+    else:
+        print(f"No pose found for tag IDs {[tag['id'] for tag in detected_info]}")
     if pose is None:
-        print(f"No pose found for tag ID {tag_id}")
-        return None
+        # Keep guiding from the IMU-propagated pose for a short while
+        pose = coasting_pose(now)
+        if pose is None:
+            return None
 
     # # # Navigation
-    twoD_pose = [pose["x"], pose["y"], pose["yaw"]]
-    relative_angle, distance_to_tag = navigate.calculate_navigation(
-        twoD_pose, target_tag_id, json_path
-    )
+    relative_angle, distance_to_tag = estimator.navigation(pose, target_tag_id)
     print(f"relative_angle: {relative_angle}, distance_to_tag: {distance_to_tag}")
     # clock = navigate.angle_to_clock_direction(relative_angle)
     # print("======================================")
@@ -144,16 +174,9 @@ def run(image, target_tag_id):
     # # output_path4plot = os.path.join(script_dir, f"images_plot/{image}_plot.jpg")
     # # plot_room.plot_room(twoD_pose, target_tag_id, json_path, output_path4plot)
 
-    if relative_angle < 30 or relative_angle > 330:
-        print("looking at the tag")
-        return ["done", relative_angle, distance_to_tag]
-    else :
-        if relative_angle > 180:
-            print("turning left")
-            return ["left", relative_angle, distance_to_tag]
-        else:
-            print("turning right")
-            return ["right", relative_angle, distance_to_tag]
+    direction = navigate.turn_direction(relative_angle)
+    print({"done": "looking at the tag", "left": "turning left", "right": "turning right"}[direction])
+    return [direction, relative_angle, distance_to_tag]
 
 def main():
     images = ["0_left"] # , "0_middle", "0_right", "1_left", "1_middle", "1_right", "2_left", "2_middle", "2_right", "3_left", "3_middle", "3_right"]
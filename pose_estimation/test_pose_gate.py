@@ -0,0 +1,39 @@
+from src import pose_filter, pose_gate
+
+
+def test_first_fix_keeps_time_for_coasting():
+    gate = pose_gate.PoseGate()
+    status, pose = gate.submit({"x": 1.0, "y": 2.0, "yaw": 30.0}, t=100.0)
+    assert status == pose_gate.ACCEPTED
+    assert gate.pose_filter.time == 100.0
+
+    # Same steps as test_pnp.coasting_pose on the next frame without a tag
+    gate.pose_filter.predict(100.5 - gate.pose_filter.time)
+    coasted = gate.pose_filter.pose()
+    assert abs(coasted["x"] - 1.0) < 1e-9 and abs(coasted["y"] - 2.0) < 1e-9
+
+
+def test_outlier_is_rejected_and_track_restarts():
+    gate = pose_gate.PoseGate(pose_filter.PoseFilter())
+    t = 0.0
+    for _ in range(5):
+        t += 0.1
+        gate.submit({"x": 0.0, "y": 0.0, "yaw": 0.0}, t)
+    status, _ = gate.submit({"x": 5.0, "y": 5.0, "yaw": 0.0}, t + 0.1)
+    assert status == pose_gate.REJECTED
+
+    for i in range(gate.max_rejections):
+        status, pose = gate.submit({"x": 5.0, "y": 5.0, "yaw": 0.0}, t + 0.2 + 0.1 * i)
+    assert status == pose_gate.ACCEPTED
+    assert abs(pose["x"] - 5.0) < 1e-9
+
+
+def test_bad_first_fix_does_not_seed_the_track():
+    gate = pose_gate.PoseGate()
+    status, pose = gate.submit({"x": 9.0, "y": 9.0, "yaw": 0.0, "reprojection_error": 50.0}, t=1.0)
+    assert status == pose_gate.REJECTED and pose is None
+    assert not gate.pose_filter.initialized
+
+    status, pose = gate.submit({"x": 0.0, "y": 0.0, "yaw": 0.0, "reprojection_error": 1.0}, t=1.1)
+    assert status == pose_gate.ACCEPTED
+    assert abs(pose["x"]) < 1e-9 and abs(pose["y"]) < 1e-9
@@ -0,0 +1,69 @@
+import asyncio
+import json
+import os
+import pytest
+
+pytest.importorskip("apriltag")
+
+import pose_server
+from src import frame_ingest
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+async def exchange(messages):
+    # Stand-in client: sends the messages one by one and collects a reply to each
+    server = pose_server.PoseServer(os.path.join(script_dir, "apriltags.json"), workers=1)
+    listener = await asyncio.start_server(server.handle_client, "127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    replies = []
+    try:
+        for raw in messages:
+            writer.write(raw)
+            await writer.drain()
+            header, _ = await asyncio.wait_for(pose_server.read_message(reader), timeout=10)
+            replies.append(header)
+    finally:
+        writer.close()
+        listener.close()
+        server.pool.shutdown()
+    return replies
+
+
+def frame_message(frame_id, payload, **fields):
+    header = {"type": "frame", "id": frame_id, "width": frame_ingest.FRAME_WIDTH,
+              "height": frame_ingest.FRAME_HEIGHT, "target_tag_id": 3}
+    header.update(fields)
+    header = json.dumps(header).encode()
+    return (pose_server.HEADER.pack(len(header)) + header +
+            pose_server.HEADER.pack(len(payload)) + payload)
+
+
+def test_short_frame_gets_an_error_and_the_client_stays_connected():
+    size = frame_ingest.FRAME_WIDTH * frame_ingest.FRAME_HEIGHT * 3 // 2
+    replies = asyncio.run(exchange([frame_message(0, b"\0" * 100), frame_message(1, b"\0" * size)]))
+    assert replies[0]["id"] == 0 and "error" in replies[0]
+    assert replies[1]["id"] == 1 and "error" not in replies[1]
+
+
+def test_bad_header_values_get_an_error_and_the_client_stays_connected():
+    size = frame_ingest.FRAME_WIDTH * frame_ingest.FRAME_HEIGHT * 3 // 2
+    frame = b"\0" * size
+    bad = [{"width": "abc"}, {"height": None}, {"width": -320}, {"height": 0},
+           {"target_tag_id": [3]}, {"target_tag_id": "3"}]
+    messages = [frame_message(i, frame, **fields) for i, fields in enumerate(bad)]
+    messages.append(frame_message(len(bad), frame, target_tag_id=None))
+    replies = asyncio.run(exchange(messages))
+    for i, reply in enumerate(replies[:-1]):
+        assert reply["id"] == i and "error" in reply
+    assert replies[-1]["id"] == len(bad) and "error" not in replies[-1]
+
+
+def test_malformed_header_gets_an_error():
+    bad = b"{not json"
+    stats = json.dumps({"type": "stats"}).encode()
+    replies = asyncio.run(exchange([pose_server.HEADER.pack(len(bad)) + bad,
+                                    pose_server.HEADER.pack(len(stats)) + stats]))
+    assert "error" in replies[0]
+    assert replies[1]["type"] == "stats"